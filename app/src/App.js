@@ -5,6 +5,7 @@ import "./App.css";
 import { marked } from "marked";
 
 const BACKEND_URL = "http://localhost:8000"; // Update this if needed
+const MAX_RESUME_ATTEMPTS = 5;
 
 function formatMessage(rawText) {
   // Only remove double asterisks that aren't part of markdown bold syntax
@@ -147,7 +148,9 @@ const App = () => {
   const chatEndRef = useRef(null);
 
   const userId = useRef(localStorage.getItem("user_id") || uuidv4());
-  const threadId = useRef(localStorage.getItem("thread_id") || "default");
+  // Older builds shared the literal "default" thread across every user
+  const storedThreadId = localStorage.getItem("thread_id");
+  const threadId = useRef(storedThreadId && storedThreadId !== "default" ? storedThreadId : uuidv4());
 
   const [typingText, setTypingText] = useState("");
   const fullTypingText = "Tara is typing...";
@@ -179,7 +182,7 @@ const App = () => {
     try {
       const res = await fetch(`${BACKEND_URL}/history?user_id=${userId.current}&thread_id=${threadId.current}`);
       const data = await res.json();
-      setMessages(data.history);
+      setMessages(data.history || []);
     } catch (err) {
       console.error("Failed to load history", err);
     }
@@ -194,22 +197,16 @@ const App = () => {
     setLoading(true);
     setCurrentAssistantMessage("");
 
-    try {
-      const response = await fetch(`${BACKEND_URL}/chat`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          user_id: userId.current,
-          thread_id: threadId.current,
-          message: userInput,
-        }),
-      });
+    const turnId = uuidv4();
+    let lastEventId = null;
+    let assistantMessage = "";
+    let finished = false;
 
+    const readStream = async (response) => {
       if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
 
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
-      let assistantMessage = "";
       let buffer = "";
 
       while (true) {
@@ -221,31 +218,81 @@ const App = () => {
         buffer = parts.pop();
 
         for (let part of parts) {
-          if (part.startsWith("data: ")) {
-            const data = part.replace(/^data: /, "");
-            try {
-              const parsed = JSON.parse(data);
-              
-              if (parsed.type === "text") {
-                // Regular text chunk
-                assistantMessage += parsed.content;
-                setCurrentAssistantMessage(formatMessage(assistantMessage));
-                
-                // Natural typing delay for streaming effect
-                const delay = Math.min(200, parsed.content.length * 15);
-                await new Promise(res => setTimeout(res, delay));
-              } else if (parsed.type === "final") {
-                // Final message - we already have this content in assistantMessage
-                // No need to do anything special here
-              }
-            } catch (e) {
-              // Fallback for non-JSON messages (shouldn't happen with our new backend)
-              assistantMessage += data;
+          let data = null;
+          for (const line of part.split("\n")) {
+            if (line.startsWith("id: ")) {
+              lastEventId = line.slice(4);
+            } else if (line.startsWith("data: ")) {
+              data = line.slice(6);
+            }
+          }
+          if (data === null) continue;
+
+          try {
+            const parsed = JSON.parse(data);
+
+            if (parsed.type === "text") {
+              // Regular text chunk
+              assistantMessage += parsed.content;
+              setCurrentAssistantMessage(formatMessage(assistantMessage));
+
+              // Natural typing delay for streaming effect
+              const delay = Math.min(200, parsed.content.length * 15);
+              await new Promise(res => setTimeout(res, delay));
+            } else if (parsed.type === "snapshot") {
+              // We reconnected after some frames left the server buffer; start from its copy
+              assistantMessage = parsed.content;
               setCurrentAssistantMessage(formatMessage(assistantMessage));
+            } else if (parsed.type === "final" || parsed.type === "error") {
+              finished = true;
             }
+          } catch (e) {
+            // Fallback for non-JSON messages (shouldn't happen with our new backend)
+            assistantMessage += data;
+            setCurrentAssistantMessage(formatMessage(assistantMessage));
           }
         }
       }
+    };
+
+    try {
+      try {
+        await readStream(await fetch(`${BACKEND_URL}/chat`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({
+            user_id: userId.current,
+            thread_id: threadId.current,
+            message: userInput,
+            turn_id: turnId,
+          }),
+        }));
+      } catch (err) {
+        console.warn("Chat stream interrupted", err);
+      }
+
+      // Dropped connection: resume the same turn instead of asking again
+      for (let attempt = 1; !finished && attempt <= MAX_RESUME_ATTEMPTS; attempt++) {
+        await new Promise(res => setTimeout(res, 500 * attempt));
+        try {
+          const headers = lastEventId ? { "Last-Event-ID": lastEventId } : {};
+          const response = lastEventId
+            ? await fetch(`${BACKEND_URL}/chat/resume?user_id=${userId.current}`, { headers })
+            : await fetch(`${BACKEND_URL}/chat`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({
+                  user_id: userId.current,
+                  thread_id: threadId.current,
+                  message: userInput,
+                  turn_id: turnId,
+                }),
+              });
+          await readStream(response);
+        } catch (err) {
+          console.warn(`Resume attempt ${attempt} failed`, err);
+        }
+      }
 
       // Push final formatted message
       setMessages(prevMessages => [
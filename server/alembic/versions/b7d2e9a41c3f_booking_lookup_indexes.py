@@ -0,0 +1,57 @@
+"""booking lookup indexes
+
+Revision ID: b7d2e9a41c3f
+Revises: fe64c46c654e
+Create Date: 2026-10-19 10:12:41.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e9a41c3f'
+down_revision: Union[str, Sequence[str], None] = 'fe64c46c654e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Foreign keys that the itinerary loaders join on
+FK_INDEXES = [
+    ('ix_flight_legs_booking_id', 'flight_legs', ['booking_id']),
+    ('ix_flight_segments_booking_id', 'flight_segments', ['booking_id']),
+    ('ix_flight_segments_leg_id', 'flight_segments', ['leg_id']),
+    ('ix_layovers_booking_id', 'layovers', ['booking_id']),
+    ('ix_layovers_leg_id', 'layovers', ['leg_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction, and keeps the tables writable while building
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_flight_bookings_user_created', 'flight_bookings',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_accommodation_bookings_user_created', 'accommodation_bookings',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        for name, table, columns in FK_INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(FK_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_accommodation_bookings_user_created', table_name='accommodation_bookings',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_flight_bookings_user_created', table_name='flight_bookings',
+                      postgresql_concurrently=True, if_exists=True)
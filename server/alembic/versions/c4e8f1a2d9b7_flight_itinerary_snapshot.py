@@ -0,0 +1,34 @@
+"""flight itinerary snapshot
+
+Revision ID: c4e8f1a2d9b7
+Revises: b7d2e9a41c3f
+Create Date: 2026-10-19 11:03:17.402951
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8f1a2d9b7'
+down_revision: Union[str, Sequence[str], None] = 'b7d2e9a41c3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable with no default, so this is a catalog-only change on Postgres;
+    # existing bookings keep rendering from their legs/segments/layovers
+    op.add_column('flight_bookings', sa.Column(
+        'itinerary_snapshot',
+        sa.JSON().with_variant(postgresql.JSONB(), 'postgresql'),
+        nullable=True,
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('flight_bookings', 'itinerary_snapshot')
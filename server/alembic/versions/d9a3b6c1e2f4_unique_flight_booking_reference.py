@@ -0,0 +1,37 @@
+"""unique flight booking reference
+
+Revision ID: d9a3b6c1e2f4
+Revises: c4e8f1a2d9b7
+Create Date: 2026-10-19 12:21:05.664810
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a3b6c1e2f4'
+down_revision: Union[str, Sequence[str], None] = 'c4e8f1a2d9b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keeps two bookings from sharing a reference. The booking worker dedupes
+    # replays by booking id, not by this; a booking that hits this constraint
+    # is parked in the dead-letter file (see booking_queue.py)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_flight_bookings_booking_reference', 'flight_bookings', ['booking_reference'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_flight_bookings_booking_reference', table_name='flight_bookings',
+                      postgresql_concurrently=True, if_exists=True)
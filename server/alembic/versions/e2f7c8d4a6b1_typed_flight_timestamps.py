@@ -0,0 +1,88 @@
+"""typed flight timestamps
+
+Revision ID: e2f7c8d4a6b1
+Revises: d9a3b6c1e2f4
+Create Date: 2026-10-19 13:40:52.207316
+
+SerpAPI reports departure and arrival times as airport-local wall clock with
+no zone, and the app has no airport -> zone table to resolve them. The typed
+columns therefore keep that wall clock as `timestamp without time zone`
+rather than pretending it is UTC. Ordering a leg's own times is exact;
+comparing against the current time is not, so list_upcoming_trips compares
+against the wall clock at UTC-12 and keeps a leg until it has departed in
+every zone.
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f7c8d4a6b1'
+down_revision: Union[str, Sequence[str], None] = 'd9a3b6c1e2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# table -> (departure string column, arrival string column)
+SOURCES = {
+    'flight_legs': ('departure_date_time', 'arrival_date_time'),
+    'flight_segments': ('departure_datetime', 'arrival_datetime'),
+}
+
+# Only rows that look like "YYYY-MM-DD HH:MM[...]" are converted; anything else stays NULL
+PG_TIMESTAMP_PATTERN = r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}'
+
+
+def _backfill_postgres(table, departure, arrival):
+    # The strings are airport-local with no zone; they are kept as naive wall clock
+    for source, target in ((departure, 'departure_at'), (arrival, 'arrival_at')):
+        op.execute(
+            f"UPDATE {table} SET {target} = {source}::timestamp "
+            f"WHERE {target} IS NULL AND {source} ~ '{PG_TIMESTAMP_PATTERN}'"
+        )
+
+
+def _parse(value):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed.replace(tzinfo=None)
+
+
+def _backfill_generic(table, departure, arrival):
+    bind = op.get_bind()
+    rows = sa.table(table, sa.column('id'), sa.column(departure), sa.column(arrival),
+                    sa.column('departure_at'), sa.column('arrival_at'))
+    for row in bind.execute(sa.select(rows.c.id, rows.c[departure], rows.c[arrival])).all():
+        bind.execute(
+            rows.update().where(rows.c.id == row[0])
+            .values(departure_at=_parse(row[1]), arrival_at=_parse(row[2]))
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in SOURCES:
+        op.add_column(table, sa.Column('departure_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('arrival_at', sa.DateTime(), nullable=True))
+
+    backfill = _backfill_postgres if op.get_bind().dialect.name == 'postgresql' else _backfill_generic
+    for table, (departure, arrival) in SOURCES.items():
+        backfill(table, departure, arrival)
+
+    op.create_index('ix_flight_legs_booking_departure', 'flight_legs', ['booking_id', 'departure_at'])
+    op.create_index('ix_flight_legs_departure_at', 'flight_legs', ['departure_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_flight_legs_departure_at', table_name='flight_legs')
+    op.drop_index('ix_flight_legs_booking_departure', table_name='flight_legs')
+    for table in reversed(list(SOURCES)):
+        op.drop_column(table, 'arrival_at')
+        op.drop_column(table, 'departure_at')
@@ -0,0 +1,94 @@
+# server/booking_cache.py
+#
+# Per-user cache of the rendered "last booking" answers. The booking tools
+# invalidate a user's entries when they commit; the TTL is only a safety net
+# for writes made outside this process.
+#
+# Entries are keyed by (kind, user, scope): a lookup whose answer depends on
+# more than the user (the flight lookup prefers the current thread's booking)
+# passes that as the scope. invalidate() stamps the (kind, user) with the next
+# tick of a cache-wide clock, and put() refuses a result whose lookup started
+# before that tick, so a lookup that raced a booking can't store a stale answer.
+# The stamps are kept for the most recently invalidated users only; a user whose
+# stamp was evicted is held to the newest evicted stamp, which is never older
+# than their own.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+BOOKING_CACHE_TTL_SECONDS = int(os.getenv("BOOKING_CACHE_TTL_SECONDS", "300"))
+BOOKING_CACHE_MAX_ENTRIES = int(os.getenv("BOOKING_CACHE_MAX_ENTRIES", "10000"))
+
+_entries = OrderedDict()  # (kind, user_id, scope) -> (value, expires_at), least recently used first
+_versions = OrderedDict()  # (kind, user_id) -> clock tick of its last invalidation, oldest first
+_clock = 0  # ticks once per invalidation
+_version_floor = 0  # newest tick evicted from _versions
+_scopes = {}  # (kind, user_id) -> scopes with an entry
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def get(kind, user_id, scope=None):
+    """Return (hit, value, version). Pass `version` back to put() after a miss."""
+    key = (kind, user_id, scope)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[1] > now:
+            _entries.move_to_end(key)
+            _stats["hits"] += 1
+            return True, entry[0], None
+        if entry is not None:
+            _drop(key)
+        _stats["misses"] += 1
+        return False, None, _clock
+
+
+def _drop(key):
+    del _entries[key]
+    scopes = _scopes.get(key[:2])
+    if scopes is not None:
+        scopes.discard(key[2])
+        if not scopes:
+            del _scopes[key[:2]]
+
+
+def put(kind, user_id, value, version, ttl=None, scope=None):
+    key = (kind, user_id, scope)
+    with _lock:
+        if _versions.get((kind, user_id), _version_floor) > version:
+            return  # a booking committed while this result was being built
+        _entries[key] = (value, time.time() + (ttl or BOOKING_CACHE_TTL_SECONDS))
+        _entries.move_to_end(key)
+        _scopes.setdefault((kind, user_id), set()).add(scope)
+        while len(_entries) > BOOKING_CACHE_MAX_ENTRIES:
+            _drop(next(iter(_entries)))
+            _stats["evictions"] += 1
+
+
+def invalidate(kind, user_id):
+    """Drop the user's entries of this kind, in every scope."""
+    global _clock, _version_floor
+    with _lock:
+        _clock += 1
+        _versions[(kind, user_id)] = _clock
+        _versions.move_to_end((kind, user_id))
+        while len(_versions) > BOOKING_CACHE_MAX_ENTRIES:
+            _version_floor = max(_version_floor, _versions.popitem(last=False)[1])
+        for scope in _scopes.pop((kind, user_id), ()):
+            _entries.pop((kind, user_id, scope), None)
+        _stats["invalidations"] += 1
+
+
+def cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "tracked_users": len(_versions),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+            "ttl_seconds": BOOKING_CACHE_TTL_SECONDS,
+        }
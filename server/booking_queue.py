@@ -0,0 +1,292 @@
+# server/booking_queue.py
+#
+# Write-behind persistence for bookings. A booking tool appends its rows to a
+# local write-ahead log (fsynced) and confirms the reference straight away; a
+# background worker group-commits queued bookings to the database in batches,
+# retrying with backoff, and then logs an ack. Unacked bookings are replayed
+# at startup.
+#
+# Delivery is exactly-once per booking: entries are keyed by the booking row's
+# primary key, which is what a replay repeats, and the worker skips ids already
+# in the database (a crash between commit and ack replays them). A booking
+# whose reference collides with another stored booking can never commit; it is
+# parked in the dead-letter file and logged rather than taken as committed.
+#
+# One process owns the WAL: replay() locks it (see file_lock.py), so with
+# several uvicorn workers each needs its own BOOKING_WAL_PATH.
+#
+# WAL lines are JSON: {"op": "put", "kind", "user_id", "ref", "rows": {table: [row, ...]}}
+# or {"op": "ack", "ids": [...]} (older logs ack by "refs").
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+import booking_cache
+from file_lock import lock_exclusive
+from db.session import AsyncSessionLocal
+from models.db_models import AccommodationBooking, FlightBooking, FlightLegDB, FlightSegmentDB, LayoverDB
+
+logger = logging.getLogger("chat_logger")
+
+WAL_PATH = os.getenv("BOOKING_WAL_PATH", "booking_wal.jsonl")
+# Parked bookings are copied here for manual repair
+DEAD_LETTER_PATH = f"{WAL_PATH}.dead"
+BATCH_SIZE = int(os.getenv("BOOKING_BATCH_SIZE", "50"))
+# How long the worker waits for more bookings to join a batch
+BATCH_WINDOW_SECONDS = float(os.getenv("BOOKING_BATCH_WINDOW_SECONDS", "0.05"))
+MAX_RETRY_DELAY_SECONDS = 30
+# A single booking that keeps failing on its own is parked after this many attempts
+MAX_ATTEMPTS = int(os.getenv("BOOKING_MAX_ATTEMPTS", "8"))
+# Rewrite the WAL with only unacked entries once it grows past this
+WAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+# Insert order per kind; parents first so foreign keys resolve
+_TABLES = {
+    "flight": [FlightBooking, FlightLegDB, FlightSegmentDB, LayoverDB],
+    "accommodation": [AccommodationBooking],
+}
+_DATETIME_COLUMNS = ("created_at", "updated_at", "departure_at", "arrival_at")
+
+_pending = {}  # booking id -> WAL entry, in arrival order
+_attempts = {}  # booking id -> failed attempts so far
+_wal_lock = threading.Lock()
+_wakeup = None  # asyncio.Event, created on the worker's loop
+_totals = {"enqueued": 0, "committed": 0, "parked": 0}  # since startup
+
+
+def _encode_row(row):
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+
+
+def _decode_row(row):
+    return {
+        k: datetime.fromisoformat(v) if k in _DATETIME_COLUMNS and isinstance(v, str) else v
+        for k, v in row.items()
+    }
+
+
+def _booking_id(entry):
+    """Primary key of the entry's booking row."""
+    return entry["rows"][_TABLES[entry["kind"]][0].__tablename__][0]["id"]
+
+
+def _is_transient(error):
+    """Connection and pool failures: the database is unavailable, not the booking bad."""
+    return isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError))
+
+
+def _write_lines(path, records):
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return os.path.getsize(path)
+
+
+def _append_wal(records, path=None):
+    with _wal_lock:
+        return _write_lines(path or WAL_PATH, records)
+
+
+def _append_put(entry):
+    # Written and registered under the lock, so a rewrite either sees the
+    # entry in _pending or runs before its line exists; it can't drop it
+    with _wal_lock:
+        _write_lines(WAL_PATH, [entry])
+        _pending[_booking_id(entry)] = entry
+
+
+def _rewrite_wal():
+    """Replace the WAL with the put lines of the bookings still pending."""
+    tmp_path = f"{WAL_PATH}.tmp"
+    with _wal_lock:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in list(_pending.values()):
+                f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, WAL_PATH)
+
+
+async def enqueue(kind, user_id, booking_reference, rows):
+    """Durably queue a booking. Returns once it is on disk; the database write happens later.
+
+    `rows` maps table name to a list of row dicts, e.g. {"flight_bookings": [...], "flight_legs": [...]}.
+    """
+    entry = {
+        "op": "put",
+        "kind": kind,
+        "user_id": user_id,
+        "ref": booking_reference,
+        "rows": {table: [_encode_row(row) for row in table_rows] for table, table_rows in rows.items()},
+    }
+    await asyncio.to_thread(_append_put, entry)
+    _totals["enqueued"] += 1
+    # A lookup that started before this booking mustn't cache its older answer
+    booking_cache.invalidate(kind, user_id)
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def pending_rows(kind, user_id, table):
+    """Rows of `table` from this user's bookings not yet in the database, oldest first."""
+    return [
+        _decode_row(row)
+        for entry in list(_pending.values())
+        if entry["kind"] == kind and entry["user_id"] == user_id
+        for row in entry["rows"].get(table, [])
+    ]
+
+
+def has_pending(kind, user_id):
+    return any(entry["kind"] == kind and entry["user_id"] == user_id for entry in list(_pending.values()))
+
+
+async def _existing_ids(session, kind, ids):
+    model = _TABLES[kind][0]
+    result = await session.execute(select(model.id).where(model.id.in_(ids)))
+    return set(result.scalars())
+
+
+async def _commit_batch(entries):
+    """Insert every booking in `entries` in one transaction, skipping bookings already stored."""
+    async with AsyncSessionLocal() as session:
+        async with session.begin():
+            for kind in _TABLES:
+                batch = [entry for entry in entries if entry["kind"] == kind]
+                if not batch:
+                    continue
+                existing = await _existing_ids(session, kind, [_booking_id(entry) for entry in batch])
+                if existing:
+                    logger.info(f"Skipping {len(existing)} {kind} bookings already committed")
+                batch = [entry for entry in batch if _booking_id(entry) not in existing]
+                for model in _TABLES[kind]:
+                    rows = [_decode_row(row) for entry in batch for row in entry["rows"].get(model.__tablename__, [])]
+                    if rows:
+                        await session.execute(insert(model), rows)
+
+
+async def _ack(entries, dead=False):
+    record = {"op": "ack", "ids": [_booking_id(entry) for entry in entries]}
+    if dead:
+        record["dead"] = True
+        await asyncio.to_thread(_append_wal, entries, DEAD_LETTER_PATH)
+    wal_size = await asyncio.to_thread(_append_wal, [record])
+    _totals["parked" if dead else "committed"] += len(entries)
+    for entry in entries:
+        _pending.pop(_booking_id(entry), None)
+        _attempts.pop(_booking_id(entry), None)
+        # Lookups read pending bookings from the queue; drop what they cached meanwhile
+        booking_cache.invalidate(entry["kind"], entry["user_id"])
+    if wal_size > WAL_COMPACT_BYTES:
+        await asyncio.to_thread(_rewrite_wal)
+
+
+async def _commit_one_by_one(entries):
+    """After a failed batch, commit entries singly so one bad booking can't hold back the rest."""
+    failed = 0
+    for entry in entries:
+        try:
+            await _commit_batch([entry])
+        except Exception as e:
+            if _is_transient(e):
+                raise
+            if isinstance(e, IntegrityError):
+                # Retrying can't help: the reference (or another unique value) is taken
+                logger.error(
+                    f"Parking booking {entry['ref']} for user {entry['user_id']}, it conflicts with a stored booking: {e}"
+                )
+                await _ack([entry], dead=True)
+                continue
+            attempts = _attempts[_booking_id(entry)] = _attempts.get(_booking_id(entry), 0) + 1
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"Parking booking {entry['ref']} after {attempts} attempts: {e}", exc_info=True)
+                await _ack([entry], dead=True)
+            else:
+                failed += 1
+                logger.warning(f"Booking {entry['ref']} failed to commit (attempt {attempts}): {e}")
+            continue
+        await _ack([entry])
+    return failed
+
+
+async def process_pending():
+    """Commit everything queued so far. Returns the number of bookings still pending."""
+    while _pending:
+        entries = list(_pending.values())[:BATCH_SIZE]
+        try:
+            await _commit_batch(entries)
+        except Exception as e:
+            if _is_transient(e):
+                logger.warning(f"Database unavailable, {len(_pending)} bookings queued: {e}")
+                break
+            logger.warning(f"Booking batch of {len(entries)} failed, retrying singly: {e}")
+            if await _commit_one_by_one(entries):
+                break
+            continue
+        await _ack(entries)
+        logger.info(f"Committed {len(entries)} queued bookings")
+    return len(_pending)
+
+
+async def run_worker():
+    """Background task: group-commit queued bookings until cancelled."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    delay = 0.5
+    while True:
+        if not _pending:
+            await _wakeup.wait()
+        _wakeup.clear()
+        await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        try:
+            remaining = await process_pending()
+        except Exception as e:
+            logger.error(f"Booking worker error: {e}", exc_info=True)
+            remaining = len(_pending)
+        if remaining:
+            # Database unavailable or some bookings still failing: back off
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY_SECONDS)
+        else:
+            delay = 0.5
+
+
+def replay():
+    """Reload unacked bookings from the WAL. Call once at startup, before the worker starts."""
+    lock_exclusive(WAL_PATH, "BOOKING_WAL_PATH")
+    if not os.path.exists(WAL_PATH):
+        return 0
+    entries = {}
+    with open(WAL_PATH, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Ignoring torn line at the end of the booking WAL")
+                break
+            if record["op"] == "put":
+                entries[_booking_id(record)] = record
+            else:
+                for booking_id in record.get("ids", []):
+                    entries.pop(booking_id, None)
+                refs = set(record.get("refs", []))
+                for booking_id in [key for key, entry in entries.items() if entry["ref"] in refs]:
+                    del entries[booking_id]
+    _pending.update(entries)
+    _rewrite_wal()
+    if entries:
+        logger.info(f"Replaying {len(entries)} unacked bookings from the WAL")
+    return len(entries)
+
+
+def queue_stats():
+    return {"pending": len(_pending), "retrying": len(_attempts), **_totals}
@@ -0,0 +1,110 @@
+# server/conversation_store.py
+#
+# Transcript store for /chat, partitioned by (user_id, thread_id). Each thread
+# keeps at most MAX_CONVERSATION_ITEMS items; older ones are trimmed but keep
+# their absolute position so history cursors stay valid.
+
+import itertools
+import os
+import uuid
+from typing import Optional
+
+MAX_CONVERSATION_ITEMS = int(os.getenv("MAX_CONVERSATION_ITEMS", "200"))
+
+# Changes on every process start so ETags never survive a restart.
+_EPOCH = uuid.uuid4().hex[:8]
+# Versions come from one process-wide counter rather than per conversation, so
+# a thread that is cleared and refilled never repeats a version (and ETag).
+_next_version = itertools.count(1).__next__
+
+_conversations = {}
+_dirty = set()  # thread keys changed since the last snapshot (see snapshot.py)
+
+
+class _Conversation:
+    __slots__ = ("items", "offset", "version")
+
+    def __init__(self):
+        self.items = []
+        self.offset = 0  # number of items trimmed from the front so far
+        self.version = 0
+
+
+def _make_key(user_id, thread_id):
+    return f"{user_id}:{thread_id}"
+
+
+def get_conversation(user_id, thread_id):
+    convo = _conversations.get(_make_key(user_id, thread_id))
+    return list(convo.items) if convo else []
+
+
+def save_conversation(user_id, thread_id, items):
+    ctx_key = _make_key(user_id, thread_id)
+    convo = _conversations.get(ctx_key)
+    if convo is None:
+        convo = _conversations[ctx_key] = _Conversation()
+    overflow = len(items) - MAX_CONVERSATION_ITEMS
+    if overflow > 0:
+        items = items[overflow:]
+        convo.offset += overflow
+    convo.items = list(items)
+    convo.version = _next_version()
+    _dirty.add(ctx_key)
+
+
+def clear_conversation(user_id, thread_id):
+    ctx_key = _make_key(user_id, thread_id)
+    _conversations.pop(ctx_key, None)
+    _dirty.add(ctx_key)
+
+
+def _compact(item):
+    return {"role": item.get("role"), "content": item.get("content")}
+
+
+def get_history_page(user_id, thread_id, before: Optional[int] = None, limit: int = 50):
+    """Return up to `limit` items older than cursor `before`, newest page first.
+
+    Cursors are absolute item positions in the thread. `next_cursor` is None
+    once the oldest retained item has been returned.
+    """
+    convo = _conversations.get(_make_key(user_id, thread_id))
+    if convo is None:
+        return {"history": [], "next_cursor": None, "etag": f'W/"{_EPOCH}-0-{before}-{limit}"'}
+
+    end = len(convo.items) if before is None else max(0, min(before - convo.offset, len(convo.items)))
+    start = max(0, end - limit)
+    return {
+        "history": [_compact(item) for item in convo.items[start:end]],
+        "next_cursor": convo.offset + start if start > 0 else None,
+        "etag": f'W/"{_EPOCH}-{convo.version}-{before}-{limit}"',
+    }
+
+
+def drain_dirty():
+    global _dirty
+    dirty, _dirty = _dirty, set()
+    return dirty
+
+
+def mark_dirty(ctx_keys):
+    _dirty.update(ctx_keys)
+
+
+def conversation_keys():
+    return list(_conversations)
+
+
+def export_conversation(ctx_key):
+    convo = _conversations.get(ctx_key)
+    if convo is None:
+        return None
+    return {"items": list(convo.items), "offset": convo.offset}
+
+
+def import_conversation(ctx_key, state):
+    convo = _conversations[ctx_key] = _Conversation()
+    convo.items = state["items"]
+    convo.offset = state["offset"]
+    convo.version = _next_version()
@@ -0,0 +1,161 @@
+# server/db/booking_queries.py
+#
+# Read-side queries for the booking history endpoints. Pages are keyset-paginated
+# on (created_at, id), newest first, which is exactly the order of the
+# (user_id, created_at DESC, id DESC) indexes, so each page is one index range
+# scan no matter how deep the client pages.
+#
+# Bookings confirmed but still in the booking queue (see booking_queue.py) are
+# merged in from the queue. They are the user's newest, so only the first page
+# and the upcoming trips need them; later pages read the database alone.
+
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, tuple_
+
+import booking_queue
+from db.session import AsyncSessionLocal
+from models.db_models import AccommodationBooking, FlightBooking, FlightLegDB
+
+MAX_PAGE_SIZE = 100
+
+# Leg departure times are airport-local wall clock with no zone (see migration
+# e2f7c8d4a6b1), so "now" is compared as the wall clock in the westernmost zone:
+# a leg stays upcoming until its departure time has passed everywhere, which
+# never hides a flight that hasn't left but can list one for up to a day after.
+_EARLIEST_UTC_OFFSET = timedelta(hours=-12)
+
+# Columns returned in list views; the heavy JSON columns only with details=True
+_PROJECTIONS = {
+    "flight": (
+        FlightBooking,
+        ["id", "booking_reference", "thread_id", "created_at", "full_name", "airlines",
+         "total_price", "currency", "is_multi_city"],
+        ["passenger_names", "email", "phone", "booking_token", "price_breakdown", "itinerary_snapshot"],
+    ),
+    "accommodation": (
+        AccommodationBooking,
+        ["id", "booking_reference", "thread_id", "created_at", "full_name", "accommodation_name",
+         "accommodation_type", "hotel_class", "total_price", "currency"],
+        ["guest_names", "email", "phone", "property_token", "price_breakdown", "accommodation_rating",
+         "accommodation_reviews", "accommodation_amenities", "accommodation_images",
+         "accommodation_formatted_images", "accommodation_link", "accommodation_formatted_link",
+         "accommodation_location"],
+    ),
+}
+
+
+def encode_cursor(created_at: datetime, booking_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), booking_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, booking_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(booking_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _newest_first(rows, limit):
+    """Merge database and queued rows, newest first, dropping a queued row the worker has meanwhile committed."""
+    unique = {row["id"]: row for row in rows}
+    return sorted(unique.values(), key=lambda row: (row["created_at"], row["id"]), reverse=True)[:limit]
+
+
+def _serialize(row):
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+
+
+async def list_bookings(kind: str, user_id: str, cursor: str = None, limit: int = 20, details: bool = False):
+    """One page of a user's bookings of `kind` ("flight" or "accommodation"), newest first.
+
+    Returns {"bookings": [...], "next_cursor": str or None}.
+    """
+    model, summary, extra = _PROJECTIONS[kind]
+    columns = [getattr(model, name) for name in summary + (extra if details else [])]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = select(*columns).where(model.user_id == user_id)
+    if cursor:
+        created_at, booking_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, booking_id))
+    # One extra row tells us whether another page exists
+    query = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(query)).mappings().all()
+    if not cursor:
+        names = [column.key for column in columns]
+        pending = booking_queue.pending_rows(kind, user_id, model.__tablename__)
+        rows = _newest_first(list(rows) + [{name: row.get(name) for name in names} for row in pending], limit + 1)
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    return {"bookings": [_serialize(row) for row in page], "next_cursor": next_cursor}
+
+
+def _earliest_wall_clock(now: datetime = None) -> datetime:
+    """The naive wall-clock time at UTC-12 for the instant `now` (default: the current time)."""
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    return (now.astimezone(timezone.utc) + _EARLIEST_UTC_OFFSET).replace(tzinfo=None)
+
+
+async def list_upcoming_trips(user_id: str, within_days: int = None, limit: int = 20, now: datetime = None):
+    """A user's flight legs that haven't departed as of `now`, soonest first.
+
+    Walks the user's bookings by the (user_id, created_at) index and each
+    booking's legs by (booking_id, departure_at).
+    """
+    now = _earliest_wall_clock(now)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = (
+        select(
+            FlightBooking.booking_reference,
+            FlightLegDB.booking_id,
+            FlightLegDB.origin,
+            FlightLegDB.destination,
+            FlightLegDB.departure_at,
+            FlightLegDB.arrival_at,
+            FlightLegDB.stops,
+        )
+        .join(FlightBooking, FlightBooking.id == FlightLegDB.booking_id)
+        .where(FlightBooking.user_id == user_id, FlightLegDB.departure_at >= now)
+    )
+    if within_days is not None:
+        query = query.where(FlightLegDB.departure_at < now + timedelta(days=within_days))
+    query = query.order_by(FlightLegDB.departure_at, FlightLegDB.booking_id).limit(limit)
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(query)).mappings().all()
+
+    references = {
+        row["id"]: row["booking_reference"]
+        for row in booking_queue.pending_rows("flight", user_id, FlightBooking.__tablename__)
+    }
+    pending = [
+        {
+            "booking_reference": references.get(leg["booking_id"]),
+            **{name: leg.get(name) for name in ("booking_id", "origin", "destination", "departure_at", "arrival_at", "stops")},
+        }
+        for leg in booking_queue.pending_rows("flight", user_id, FlightLegDB.__tablename__)
+        if leg.get("departure_at") is not None
+        and leg["departure_at"] >= now
+        and (within_days is None or leg["departure_at"] < now + timedelta(days=within_days))
+    ]
+    if pending:
+        # A leg both queued and committed appears once
+        seen = {(row["booking_id"], row["departure_at"]) for row in rows}
+        rows = list(rows) + [leg for leg in pending if (leg["booking_id"], leg["departure_at"]) not in seen]
+        rows = sorted(rows, key=lambda row: (row["departure_at"], row["booking_id"]))[:limit]
+    return {"trips": [_serialize(row) for row in rows]}
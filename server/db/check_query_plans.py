@@ -0,0 +1,102 @@
+# server/db/check_query_plans.py
+#
+# Checks that the "latest booking per user" and itinerary lookups are served
+# by indexes. Run against a migrated database:
+#
+#     python -m db.check_query_plans [user_id]
+#
+# Sequential scans are disabled for the session so the planner reports the
+# index it *would* use even on a near-empty development table; a query that
+# still plans a Seq Scan has no usable index.
+
+import json
+import sys
+
+from sqlalchemy import text
+
+from db.session import engine
+
+# (description, SQL, index expected in the plan, scan node required or None)
+CHECKS = [
+    (
+        "latest flight booking",
+        "SELECT * FROM flight_bookings WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 1",
+        "ix_flight_bookings_user_created",
+        None,
+    ),
+    (
+        "latest flight booking id",
+        "SELECT id FROM flight_bookings WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 1",
+        "ix_flight_bookings_user_created",
+        "Index Only Scan",  # every column it needs is in the index
+    ),
+    (
+        "latest accommodation booking",
+        "SELECT * FROM accommodation_bookings WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 1",
+        "ix_accommodation_bookings_user_created",
+        None,
+    ),
+    (
+        "upcoming legs of a user",
+        "SELECT l.* FROM flight_legs l JOIN flight_bookings b ON b.id = l.booking_id "
+        "WHERE b.user_id = :user_id AND l.departure_at >= LOCALTIMESTAMP ORDER BY l.departure_at LIMIT 20",
+        "ix_flight_legs_booking_departure",
+        None,
+    ),
+    (
+        "legs of a booking",
+        "SELECT * FROM flight_legs WHERE booking_id = :booking_id",
+        "ix_flight_legs_booking_id",
+        None,
+    ),
+    (
+        "segments of a leg",
+        "SELECT * FROM flight_segments WHERE leg_id = :leg_id",
+        "ix_flight_segments_leg_id",
+        None,
+    ),
+    (
+        "layovers of a leg",
+        "SELECT * FROM layovers WHERE leg_id = :leg_id",
+        "ix_layovers_leg_id",
+        None,
+    ),
+]
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def check_plans(user_id="plan-check"):
+    """Return a list of failures; empty when every query is index-backed."""
+    params = {"user_id": user_id, "booking_id": "plan-check", "leg_id": "plan-check"}
+    failures = []
+    with engine.connect() as conn:
+        conn.execute(text("SET enable_seqscan = off"))
+        for description, sql, expected_index, required_node in CHECKS:
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = list(_walk(plan[0]["Plan"]))
+            node_types = [node["Node Type"] for node in nodes]
+            indexes = {node.get("Index Name") for node in nodes}
+            ok = (
+                "Seq Scan" not in node_types
+                and expected_index in indexes
+                and (required_node is None or required_node in node_types)
+            )
+            print(f"{'OK  ' if ok else 'FAIL'} {description}: {' -> '.join(node_types)} {sorted(i for i in indexes if i)}")
+            if not ok:
+                failures.append(description)
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check_plans(*sys.argv[1:2])
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,152 @@
+# server/fare_rules.py
+#
+# One place for how a base fare becomes a price for a party: passenger-type
+# factors, per-cabin and per-route adjustments, and taxes, all driven by a
+# rules table instead of constants repeated in every option builder.
+#
+# Every rule whose kind, cabin and route match applies, in table order: a
+# later rule's factors override earlier ones, multipliers multiply and taxes
+# add up. The effective rule for a (kind, cabin, route) is resolved once and
+# cached, and a whole search's fares are then priced in one pass.
+#
+# FARE_RULES_PATH may point at a JSON list of rules layered over the defaults:
+#     [{"kind": "flight", "cabin": "business", "child_factor": 1.0},
+#      {"kind": "flight", "route": "NBO-*", "tax_per_passenger": 12.5}]
+# A rule with the same kind, cabin and route as an earlier one updates only
+# the fields it sets; others are added after the defaults, so anything they
+# leave out (e.g. the child and infant factors above) keeps the default.
+
+import json
+import logging
+import os
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from models.accommodation_models import PriceBreakdown as StayPriceBreakdown
+from models.accommodation_models import PriceBreakdownEntry as StayPriceBreakdownEntry
+from models.flight_models import PriceBreakdown, PriceBreakdownEntry
+
+logger = logging.getLogger("chat_logger")
+
+FARE_RULES_PATH = os.getenv("FARE_RULES_PATH")
+
+
+@dataclass(frozen=True)
+class FareRule:
+    kind: str = "flight"  # "flight" or "accommodation"
+    cabin: Optional[str] = None  # None matches any cabin (flights only)
+    route: Optional[str] = None  # "NBO-MBA"; "*" on either side matches any airport (flights only)
+    child_factor: Optional[float] = None  # share of the adult fare a child pays
+    infant_factor: Optional[float] = None
+    fare_multiplier: float = 1.0
+    tax_rate: float = 0.0  # on the party's fare total
+    tax_per_passenger: float = 0.0  # infants excluded
+
+    def matches(self, kind, cabin, route):
+        if self.kind != kind:
+            return False
+        if self.cabin and (cabin or "").lower() != self.cabin.lower():
+            return False
+        if self.route:
+            want_from, _, want_to = self.route.upper().partition("-")
+            have_from, _, have_to = (route or "").upper().partition("-")
+            if want_from not in ("*", have_from) or want_to not in ("*", have_to):
+                return False
+        return True
+
+
+DEFAULT_RULES = (
+    FareRule(kind="flight", child_factor=0.75, infant_factor=0.10),
+    FareRule(kind="accommodation", child_factor=0.75, infant_factor=0.0),
+)
+
+
+def _load_rules():
+    if not FARE_RULES_PATH:
+        return DEFAULT_RULES
+    known = {f.name for f in fields(FareRule)}
+    rules = {(rule.kind, rule.cabin, rule.route): rule for rule in DEFAULT_RULES}
+    with open(FARE_RULES_PATH, encoding="utf-8") as f:
+        overrides = json.load(f)
+    for override in overrides:
+        override = {k: v for k, v in override.items() if k in known}
+        key = (override.get("kind", "flight"), override.get("cabin"), override.get("route"))
+        rules[key] = replace(rules[key], **override) if key in rules else FareRule(**override)
+    logger.info(f"Layered {len(overrides)} fare rules from {FARE_RULES_PATH} over the defaults")
+    return tuple(rules.values())
+
+
+RULES = _load_rules()
+
+
+@lru_cache(maxsize=1024)
+def effective_rule(kind: str, cabin: str = None, route: str = None) -> FareRule:
+    """All matching rules folded into one."""
+    child, infant, multiplier, tax_rate, tax_per_passenger = 1.0, 1.0, 1.0, 0.0, 0.0
+    for rule in RULES:
+        if not rule.matches(kind, cabin, route):
+            continue
+        child = rule.child_factor if rule.child_factor is not None else child
+        infant = rule.infant_factor if rule.infant_factor is not None else infant
+        multiplier *= rule.fare_multiplier
+        tax_rate += rule.tax_rate
+        tax_per_passenger += rule.tax_per_passenger
+    return FareRule(kind, cabin, route, child, infant, multiplier, tax_rate, tax_per_passenger)
+
+
+def _party_totals(base_fares, adults, children, infants, rule):
+    """(fare per person, adult total, child total, infant total, taxes, total) for each base fare."""
+    weight = adults + rule.child_factor * children + rule.infant_factor * infants
+    fixed_tax = rule.tax_per_passenger * (adults + children)
+    rows = []
+    for base in base_fares:
+        fare = float(base or 0) * rule.fare_multiplier
+        taxes = fare * weight * rule.tax_rate + fixed_tax if fare else 0.0
+        rows.append((
+            fare,
+            fare * adults,
+            fare * rule.child_factor * children,
+            fare * rule.infant_factor * infants,
+            taxes,
+            fare * weight + taxes,
+        ))
+    return rows
+
+
+def price_flight_fares(
+    base_fares: Sequence[float], adults: int, children: int = 0, infants: int = 0,
+    cabin: str = None, route: str = None,
+) -> List[PriceBreakdown]:
+    """Price per-person base fares for a party; one PriceBreakdown per fare, in order."""
+    rule = effective_rule("flight", cabin, route)
+    return [
+        PriceBreakdown(
+            base_fare_per_person=fare,
+            adults=PriceBreakdownEntry(count=adults, total=adult_total),
+            children=PriceBreakdownEntry(count=children, total=child_total) if children else None,
+            infants=PriceBreakdownEntry(count=infants, total=infant_total) if infants else None,
+            taxes=taxes or None,
+            total_price=total,
+        )
+        for fare, adult_total, child_total, infant_total, taxes, total
+        in _party_totals(base_fares, adults, children, infants, rule)
+    ]
+
+
+def price_stay_rates(
+    nightly_rates: Sequence[float], adults: int, children: int = 0,
+) -> List[Optional[StayPriceBreakdown]]:
+    """Price per-person nightly rates for a party; None where there's no rate to price."""
+    rule = effective_rule("accommodation")
+    return [
+        StayPriceBreakdown(
+            base_rate_per_person=rate,
+            adults=StayPriceBreakdownEntry(count=adults, total=adult_total),
+            children=StayPriceBreakdownEntry(count=children, total=child_total) if children else None,
+            taxes=taxes or None,
+            total_price=total,
+        ) if rate > 0 else None
+        for rate, adult_total, child_total, _, taxes, total
+        in _party_totals(nightly_rates, adults, children, 0, rule)
+    ]
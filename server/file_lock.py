@@ -0,0 +1,27 @@
+# server/file_lock.py
+#
+# The booking WAL and the state snapshot are each written, rewritten and
+# replayed by one process. Two uvicorn workers sharing a path would replay each
+# other's entries and lose lines on compaction, so the owner takes an exclusive
+# lock on "<path>.lock" at startup and a second process fails loudly instead.
+
+import fcntl
+import os
+
+_held = {}  # path -> open lock file, kept open for the life of the process
+
+
+def lock_exclusive(path: str, setting: str):
+    """Lock `path` for this process, or raise RuntimeError naming the env var to set per worker."""
+    path = os.path.abspath(path)
+    if path in _held:
+        return
+    lock_file = open(f"{path}.lock", "a")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(
+            f"{path} is in use by another process. Run a single worker, or give each worker its own {setting}."
+        )
+    _held[path] = lock_file
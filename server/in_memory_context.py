@@ -1,24 +1,319 @@
 # utils/context.py
+#
+# Sync tools (search_flight, search_accommodation) run in worker threads while
+# async tools (book_flight, ...) run on the event loop, so the store is
+# sharded by thread key: a shard lock only guards the shard's thread map and
+# each thread's entries have their own lock. Lock order is always
+# shard lock -> thread lock -> byte counter lock.
+
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# Search results are only useful while the user is choosing, so per-option keys expire
+OPTION_TTL_SECONDS = int(os.getenv("CONTEXT_OPTION_TTL_SECONDS", "3600"))
+# Threads nobody has touched for this long are dropped entirely
+THREAD_IDLE_TTL_SECONDS = int(os.getenv("CONTEXT_THREAD_IDLE_SECONDS", str(6 * 3600)))
+# Global cap across all threads; least recently used threads are evicted first
+MAX_CONTEXT_BYTES = int(os.getenv("CONTEXT_MAX_BYTES", str(256 * 1024 * 1024)))
+NUM_SHARDS = int(os.getenv("CONTEXT_SHARDS", "16"))
+SWEEP_INTERVAL_SECONDS = 60
+
+# Default TTLs for keys set without an explicit one, matched by prefix
+_PREFIX_TTLS = {
+    "flight_option": OPTION_TTL_SECONDS,
+    "accommodation_option": OPTION_TTL_SECONDS,
+}
+
+_MISSING = object()
+
+
+class _ThreadContext:
+    __slots__ = ("entries", "nbytes", "last_access", "lock", "dead")
+
+    def __init__(self):
+        self.entries = {}  # key -> (value, expires_at or None, nbytes)
+        self.nbytes = 0
+        self.last_access = time.time()
+        self.lock = threading.Lock()
+        self.dead = False  # set once the thread has been dropped from its shard
+
+
+class _Shard:
+    __slots__ = ("threads", "lock")
+
+    def __init__(self):
+        self.threads = OrderedDict()  # ctx_key -> _ThreadContext, least recently used first
+        self.lock = threading.Lock()
+
+
+_shards = [_Shard() for _ in range(NUM_SHARDS)]
+_total_bytes = 0
+_bytes_lock = threading.Lock()
+_last_sweep = 0.0
+
+# Thread keys changed since the last snapshot (see snapshot.py)
+_dirty = set()
+_dirty_lock = threading.Lock()
 
-_context_store = {}
 
 def _make_key(user_id, thread_id):
     return f"{user_id}:{thread_id}"
 
-def set_context(user_id, thread_id, key, value):
+
+def _shard_for(ctx_key):
+    return _shards[zlib.crc32(ctx_key.encode("utf-8")) % NUM_SHARDS]
+
+
+def _estimate_size(value):
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+def _default_ttl(key):
+    for prefix, ttl in _PREFIX_TTLS.items():
+        if key.startswith(prefix):
+            return ttl
+    return None
+
+
+def _mark_dirty(ctx_key):
+    with _dirty_lock:
+        _dirty.add(ctx_key)
+
+
+def _add_bytes(delta):
+    global _total_bytes
+    with _bytes_lock:
+        _total_bytes += delta
+
+
+def _get_thread(ctx_key, create=False):
+    shard = _shard_for(ctx_key)
+    with shard.lock:
+        ctx = shard.threads.get(ctx_key)
+        if ctx is None:
+            if not create:
+                return None
+            ctx = shard.threads[ctx_key] = _ThreadContext()
+        else:
+            shard.threads.move_to_end(ctx_key)
+        ctx.last_access = time.time()
+        return ctx
+
+
+def _drop_thread(ctx_key):
+    shard = _shard_for(ctx_key)
+    with shard.lock:
+        ctx = shard.threads.pop(ctx_key, None)
+        if ctx is None:
+            return
+        with ctx.lock:
+            ctx.dead = True
+            _add_bytes(-ctx.nbytes)
+    _mark_dirty(ctx_key)
+
+
+# Callers must hold ctx.lock for the helpers below.
+
+def _live_value(ctx, key, now):
+    entry = ctx.entries.get(key)
+    if entry is None:
+        return _MISSING
+    value, expires_at, _ = entry
+    if expires_at and expires_at <= now:
+        _drop_entry(ctx, key)
+        return _MISSING
+    return value
+
+
+def _drop_entry(ctx, key):
+    _, _, nbytes = ctx.entries.pop(key)
+    ctx.nbytes -= nbytes
+    _add_bytes(-nbytes)
+
+
+def _put_entry(ctx, key, value, ttl, now):
+    if key in ctx.entries:
+        _drop_entry(ctx, key)
+    ttl = ttl if ttl is not None else _default_ttl(key)
+    nbytes = _estimate_size(value)
+    ctx.entries[key] = (value, now + ttl if ttl else None, nbytes)
+    ctx.nbytes += nbytes
+    _add_bytes(nbytes)
+
+
+def _with_thread(ctx_key, fn):
+    """Run fn(ctx) under the thread's lock, retrying if the thread is dropped concurrently."""
+    while True:
+        ctx = _get_thread(ctx_key, create=True)
+        with ctx.lock:
+            if not ctx.dead:
+                return fn(ctx)
+
+
+def _evict_over_cap(keep_key):
+    while _total_bytes > MAX_CONTEXT_BYTES:
+        victim, oldest = None, None
+        for shard in _shards:
+            with shard.lock:
+                for ctx_key, ctx in shard.threads.items():
+                    if ctx_key == keep_key:
+                        continue
+                    if oldest is None or ctx.last_access < oldest:
+                        victim, oldest = ctx_key, ctx.last_access
+                    break  # the head is the shard's least recently used thread
+        if victim is None:
+            return
+        _drop_thread(victim)
+
+
+def _maybe_sweep(now):
+    global _last_sweep
+    if now - _last_sweep > SWEEP_INTERVAL_SECONDS:
+        _last_sweep = now
+        sweep_expired(now)
+
+
+def sweep_expired(now=None):
+    """Drop expired keys and idle threads. Runs at most once per sweep interval from set_context."""
+    now = now or time.time()
+    for shard in _shards:
+        with shard.lock:
+            idle = {k for k, ctx in shard.threads.items() if now - ctx.last_access > THREAD_IDLE_TTL_SECONDS}
+            active = [ctx for k, ctx in shard.threads.items() if k not in idle]
+        for ctx_key in idle:
+            _drop_thread(ctx_key)
+        for ctx in active:
+            with ctx.lock:
+                for key in [k for k, (_, expires_at, _) in ctx.entries.items() if expires_at and expires_at <= now]:
+                    _drop_entry(ctx, key)
+
+
+def set_context(user_id, thread_id, key, value, ttl=None):
+    now = time.time()
+    _maybe_sweep(now)
     ctx_key = _make_key(user_id, thread_id)
-    if ctx_key not in _context_store:
-        _context_store[ctx_key] = {}
-    _context_store[ctx_key][key] = value
+    _with_thread(ctx_key, lambda ctx: _put_entry(ctx, key, value, ttl, now))
+    _mark_dirty(ctx_key)
+    _evict_over_cap(ctx_key)
 
-def get_context(user_id, thread_id, key, default=None):
+def compare_and_set(user_id, thread_id, key, expected, value, ttl=None):
+    """Atomically set `key` to `value` if its current value equals `expected` (None if unset).
+
+    Returns True when the value was written.
+    """
+    now = time.time()
     ctx_key = _make_key(user_id, thread_id)
-    return _context_store.get(ctx_key, {}).get(key, default)
+
+    def _cas(ctx):
+        current = _live_value(ctx, key, now)
+        if (None if current is _MISSING else current) != expected:
+            return False
+        _put_entry(ctx, key, value, ttl, now)
+        return True
+
+    written = _with_thread(ctx_key, _cas)
+    if written:
+        _mark_dirty(ctx_key)
+        _evict_over_cap(ctx_key)
+    return written
+
+def get_context(user_id, thread_id, key, default=None):
+    ctx = _get_thread(_make_key(user_id, thread_id))
+    if ctx is None:
+        return default
+    with ctx.lock:
+        value = _live_value(ctx, key, time.time())
+    return default if value is _MISSING else value
 
 def get_all_context(user_id, thread_id):
-    ctx_key = _make_key(user_id, thread_id)
-    return _context_store.get(ctx_key, {})
+    ctx = _get_thread(_make_key(user_id, thread_id))
+    if ctx is None:
+        return {}
+    now = time.time()
+    with ctx.lock:
+        return {k: v for k, (v, expires_at, _) in ctx.entries.items() if not expires_at or expires_at > now}
 
 def clear_context(user_id, thread_id):
-    ctx_key = _make_key(user_id, thread_id)
-    _context_store.pop(ctx_key, None)
+    _drop_thread(_make_key(user_id, thread_id))
+
+def context_stats(top=20):
+    """Gauges for the store: totals plus entries/bytes for the `top` largest threads."""
+    threads = []
+    for shard in _shards:
+        with shard.lock:
+            threads.extend(shard.threads.items())
+    largest = sorted(threads, key=lambda item: item[1].nbytes, reverse=True)[:top]
+    now = time.time()
+    return {
+        "threads": len(threads),
+        "entries": sum(len(ctx.entries) for _, ctx in threads),
+        "bytes": _total_bytes,
+        "max_bytes": MAX_CONTEXT_BYTES,
+        "per_thread": {
+            ctx_key: {"entries": len(ctx.entries), "bytes": ctx.nbytes, "idle_seconds": round(now - ctx.last_access)}
+            for ctx_key, ctx in largest
+        },
+    }
+
+
+def drain_dirty():
+    """Return and reset the set of thread keys changed since the last call."""
+    global _dirty
+    with _dirty_lock:
+        dirty, _dirty = _dirty, set()
+    return dirty
+
+def mark_dirty(ctx_keys):
+    with _dirty_lock:
+        _dirty.update(ctx_keys)
+
+def thread_keys():
+    keys = []
+    for shard in _shards:
+        with shard.lock:
+            keys.extend(shard.threads)
+    return keys
+
+def export_thread(ctx_key):
+    """A picklable copy of one thread's live entries, or None if the thread is gone.
+
+    A read for the snapshot, not a use: the thread's last_access and LRU
+    position are left alone so idle expiry and eviction still see it as idle.
+    """
+    shard = _shard_for(ctx_key)
+    with shard.lock:
+        ctx = shard.threads.get(ctx_key)
+    if ctx is None:
+        return None
+    now = time.time()
+    with ctx.lock:
+        entries = {k: (v, expires_at) for k, (v, expires_at, _) in ctx.entries.items() if not expires_at or expires_at > now}
+        return {"entries": entries, "last_access": ctx.last_access}
+
+def import_thread(ctx_key, state):
+    now = time.time()
+    if now - state["last_access"] > THREAD_IDLE_TTL_SECONDS:
+        return
+
+    def _load(ctx):
+        for key, (value, expires_at) in state["entries"].items():
+            if not expires_at or expires_at > now:
+                # ttl=0 keeps entries that never expire from picking up a prefix default
+                _put_entry(ctx, key, value, expires_at - now if expires_at else 0, now)
+        ctx.last_access = state["last_access"]
+
+    _with_thread(ctx_key, _load)
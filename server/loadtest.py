@@ -0,0 +1,251 @@
+# server/loadtest.py
+#
+# Drives N concurrent simulated users through multi-turn flight and hotel
+# booking conversations against /chat and reports latency percentiles:
+#
+#     python loadtest.py --users 50 --ramp-up 10 --base-url http://localhost:8000
+#
+# Each turn's SSE stream is parsed frame by frame to measure time to first
+# token (first "text" frame), the gaps between text frames and time to the
+# "final" frame. A turn counts as an error on a non-200 response, an "error"
+# frame, a dropped stream, or --turn-timeout. Server RSS is sampled from
+# /metrics/process while the test runs. A run whose booking turns complete but
+# never reach the booking queue (see /metrics/booking_queue) exits non-zero, so
+# a scripted model that stops booking can't pass as a healthy run.
+#
+# Against local stand-ins instead of OpenAI and SerpAPI (see offline_model.py
+# and serpapi_stub.py):
+#
+#     uvicorn serpapi_stub:app --port 8001 &
+#     MODEL_PROVIDER=offline SERP_API_URL=http://localhost:8001/search.json uvicorn main:app &
+#     python loadtest.py --users 200
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+BOOKING_TURN = "Book option 1 for Load Test, loadtest@example.com, +254700000000"
+
+SCENARIOS = {
+    "flight": [
+        "Hi, I need a flight",
+        "From Nairobi to Mombasa on {date}, one adult, economy",
+        "Show me the cheapest option",
+        BOOKING_TURN,
+        "What did I just book?",
+    ],
+    "hotel": [
+        "I'm looking for a hotel",
+        "In Mombasa, checking in {date} for 3 nights, 2 adults",
+        "Which one has the best rating?",
+        BOOKING_TURN,
+        "Show me my last accommodation booking",
+    ],
+    "trip": [
+        "I want to plan a trip to Mombasa",
+        "Find me a flight from Nairobi on {date}, returning a week later",
+        "Now a hotel near the beach for the same dates",
+        "How much would the whole trip cost?",
+    ],
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class Results:
+    def __init__(self):
+        self.ttft = []
+        self.gaps = []
+        self.completion = []
+        self.turns = 0
+        self.booking_turns = 0  # completed turns that asked for a booking
+        self.bookings = None  # bookings the server queued during the run, if it reports them
+        self.errors = defaultdict(int)
+        self.rss = []  # (seconds since start, rss bytes)
+
+    def error(self, kind):
+        self.errors[kind] += 1
+
+
+async def read_sse(response):
+    """Yield the JSON payload of each `data:` frame."""
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            yield json.loads(line[5:].strip())
+
+
+async def _stream_turn(client, results, body, started):
+    """Read one /chat turn to its final frame; True if it completed."""
+    first = last = None
+    async with client.stream("POST", "/chat", json=body) as response:
+        if response.status_code != 200:
+            results.error(f"http_{response.status_code}")
+            return False
+        async for frame in read_sse(response):
+            now = time.perf_counter()
+            if frame.get("type") == "text":
+                if first is None:
+                    first = now
+                    results.ttft.append(now - started)
+                else:
+                    results.gaps.append(now - last)
+                last = now
+            elif frame.get("type") == "error":
+                results.error("error_frame")
+                return False
+            elif frame.get("type") == "final":
+                results.completion.append(now - started)
+                return True
+    results.error("stream_ended_without_final")
+    return False
+
+
+async def run_turn(client, args, results, user_id, thread_id, message):
+    body = {"user_id": user_id, "thread_id": thread_id, "message": message, "turn_id": uuid.uuid4().hex}
+    started = time.perf_counter()
+    results.turns += 1
+    try:
+        # wait_for rather than asyncio.timeout, which needs Python 3.11
+        return await asyncio.wait_for(_stream_turn(client, results, body, started), args.turn_timeout)
+    except asyncio.TimeoutError:
+        results.error("timeout")
+    except httpx.HTTPError as e:
+        results.error(type(e).__name__)
+    return False
+
+
+async def simulated_user(client, args, results, index):
+    await asyncio.sleep(args.ramp_up * index / max(args.users, 1))
+    rng = random.Random(args.seed + index)
+    scenario = args.scenario if args.scenario != "mixed" else rng.choice(sorted(SCENARIOS))
+    user_id, thread_id = f"loadtest-{index}-{uuid.uuid4().hex[:8]}", uuid.uuid4().hex
+    date = time.strftime("%Y-%m-%d", time.localtime(time.time() + rng.randint(14, 90) * 86400))
+    for message in SCENARIOS[scenario]:
+        if not await run_turn(client, args, results, user_id, thread_id, message.format(date=date)):
+            break
+        if message == BOOKING_TURN:
+            results.booking_turns += 1
+        await asyncio.sleep(rng.uniform(0, 2 * args.think_time))
+
+
+async def sample_rss(client, args, results, started):
+    while True:
+        try:
+            stats = (await client.get("/metrics/process", timeout=5)).json()
+            results.rss.append((time.perf_counter() - started, stats["rss_bytes"]))
+        except Exception:
+            pass  # the server being too busy to answer is itself a finding; keep going
+        await asyncio.sleep(args.rss_interval)
+
+
+async def queued_bookings(client):
+    """Bookings the server has queued since it started, or None if it doesn't say."""
+    try:
+        return (await client.get("/metrics/booking_queue", timeout=5)).json()["enqueued"]
+    except Exception:
+        return None
+
+
+def _ms(value):
+    return f"{value * 1000:8.0f}" if value is not None else "       -"
+
+
+def report(results, elapsed):
+    failed = sum(results.errors.values())
+    print(f"\n{results.turns} turns in {elapsed:.1f}s ({results.turns / elapsed:.2f} turns/s), "
+          f"{failed} failed ({100 * failed / max(results.turns, 1):.1f}%)")
+    for kind, count in sorted(results.errors.items()):
+        print(f"  {kind}: {count}")
+    print(f"\n{'ms':<22}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for label, values in (("time to first token", results.ttft),
+                          ("inter-chunk gap", results.gaps),
+                          ("turn completion", results.completion)):
+        print(f"{label:<22}{_ms(percentile(values, 50))}{_ms(percentile(values, 95))}"
+              f"{_ms(percentile(values, 99))}{_ms(max(values) if values else None)}")
+    if results.rss:
+        print("\nserver RSS (MiB) over time")
+        samples = results.rss[::max(1, len(results.rss) // 20)]
+        if samples[-1] is not results.rss[-1]:
+            samples.append(results.rss[-1])
+        for at, rss in samples:
+            print(f"  {at:7.1f}s  {rss / 2**20:8.1f}")
+    if results.booking_turns:
+        queued = "unknown" if results.bookings is None else results.bookings
+        print(f"\n{results.booking_turns} booking turns completed, {queued} bookings queued")
+    if no_bookings(results):
+        print("WARNING: no booking reached the booking queue; the run never exercised the write path")
+
+
+def no_bookings(results):
+    return results.booking_turns > 0 and results.bookings == 0
+
+
+def summary(results, elapsed):
+    return {
+        "turns": results.turns,
+        "elapsed_seconds": elapsed,
+        "errors": dict(results.errors),
+        "booking_turns": results.booking_turns,
+        "bookings_queued": results.bookings,
+        **{
+            f"{name}_ms": {f"p{p}": (percentile(values, p) or 0) * 1000 for p in (50, 95, 99)}
+            for name, values in (("ttft", results.ttft), ("gap", results.gaps), ("completion", results.completion))
+        },
+        "rss_bytes": results.rss,
+    }
+
+
+async def main(args):
+    results = Results()
+    limits = httpx.Limits(max_connections=args.users + 1, max_keepalive_connections=args.users + 1)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=None) as client:
+        queued_before = await queued_bookings(client)
+        started = time.perf_counter()
+        sampler = asyncio.create_task(sample_rss(client, args, results, started))
+        await asyncio.gather(*(simulated_user(client, args, results, i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+        queued_after = await queued_bookings(client)
+        if queued_before is not None and queued_after is not None:
+            results.bookings = queued_after - queued_before
+    report(results, elapsed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary(results, elapsed), f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent multi-turn load test for /chat")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS) + ["mixed"], default="mixed")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between a user's turns")
+    parser.add_argument("--turn-timeout", type=float, default=120.0)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write a machine-readable summary here")
+    parser.add_argument("--max-error-rate", type=float, default=None,
+                        help="exit non-zero if more than this fraction of turns fail")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    error_rate = sum(results.errors.values()) / max(results.turns, 1)
+    too_many_errors = args.max_error_rate is not None and error_rate > args.max_error_rate
+    sys.exit(1 if too_many_errors or no_bookings(results) else 0)
@@ -1,42 +1,40 @@
 #main.py
-from fastapi import FastAPI, Request, BackgroundTasks
+import time
+_APP_IMPORT_STARTED = time.perf_counter()
+from fastapi import FastAPI, Request, BackgroundTasks, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
-import openai
 import os
 from dotenv import load_dotenv
 import logging
 import uuid
-from tools.search_flight import search_flight
-from models.flight_models import SearchFlightInput
-from agents import( Agent,
-    HandoffOutputItem,
-    ItemHelpers,
-    MessageOutputItem,
-    RunContextWrapper,
-    Runner,
-    ToolCallItem,
-    ToolCallOutputItem,
-    TResponseInputItem,
-    function_tool,
-    handoff,
-    trace,)
-from in_memory_context import get_context, set_context, clear_context,get_all_context
+
+# Load environment variables before any project module reads them at import time
+load_dotenv()
+
+# The agent stack (agents, openai, run_agents.*) is imported by warmup.py in
+# the background, not here; run_chat_turn waits for it
+from in_memory_context import get_context, set_context, clear_context,get_all_context, context_stats
+from conversation_store import get_conversation, save_conversation, clear_conversation, get_history_page
+import snapshot
+import booking_cache
+import booking_queue
+from process_metrics import process_stats
+from tools.output_guard import guard_stats
+from db.booking_queries import list_bookings, list_upcoming_trips
+import hashlib
+from stream_buffer import start_turn, get_turn, parse_last_event_id, stream_frames
 import json
 from typing import Optional,List
-from run_agents.triage_agent import triage_agent
+import warmup
 import asyncio
-from openai.types.responses import ResponseTextDeltaEvent
 from typing import Optional, AsyncGenerator
 from dataclasses import dataclass
 from models.context_models import UserInfo
 
 import re
 
-# Load environment variables
-load_dotenv()
-
 # Initialize FastAPI app
 app = FastAPI()
 
@@ -60,37 +58,47 @@ console_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
-# Set OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# Check if key exists
-if not openai.api_key:
+# Check the OpenAI key exists; the agents SDK reads it from the environment
+# (the offline load-test model doesn't need one)
+if not os.getenv("OPENAI_API_KEY") and os.getenv("MODEL_PROVIDER", "openai").lower() != "offline":
     raise ValueError("Missing OpenAI API key in environment variables")
 
 SERP_API_KEY=os.getenv("SERP_API_KEY")
- 
 
 
+_background_tasks: list[asyncio.Task] = []
 
-# In-memory conversation store
-conversation_store: dict[str, List[TResponseInputItem]] = {}
-
-# Incoming chat message model
-class ChatMessage(BaseModel):
-    user_id: str
-    thread_id: str
-    message: str
+@app.on_event("startup")
+async def startup():
+    # Resume threads from the last run before serving any request
+    snapshot.restore()
+    _background_tasks.append(asyncio.create_task(snapshot.run_snapshotter()))
+    # Bookings confirmed before a crash but not yet in the database
+    booking_queue.replay()
+    _background_tasks.append(asyncio.create_task(booking_queue.run_worker()))
+    # Import and prime the agent stack without holding up the port
+    _background_tasks.append(asyncio.create_task(warmup.warm_up()))
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    for task in _background_tasks:
+        task.cancel()
+    await snapshot.snapshot_once()
+    # Last chance to commit queued bookings; anything left is replayed from the WAL next start
+    try:
+        await asyncio.wait_for(booking_queue.process_pending(), timeout=5)
+    except Exception as e:
+        logger.warning(f"Bookings left queued at shutdown: {e}")
+ 
 
-# In-memory conversation store
-conversation_store: dict[str, List[TResponseInputItem]] = {}
 
 # Incoming chat message model
 class ChatMessage(BaseModel):
     user_id: str
     thread_id: str
     message: str
+    turn_id: Optional[str] = None  # client-generated; retrying the same turn resumes it instead of re-running
 
 
 
@@ -98,11 +106,54 @@ from fastapi.responses import StreamingResponse
 import json
 
 @app.post("/chat")
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage, request: Request):
     print(">>> /chat endpoint hit")
     print(">>> Message:", message)
 
-    input_items: List[TResponseInputItem] = conversation_store.get(message.thread_id, [])
+    # A retried POST for a turn we already know about must not re-run the agent
+    turn = get_turn(message.turn_id)
+    if turn and turn.user_id == message.user_id:
+        last_turn_id, last_seq = parse_last_event_id(request.headers.get("last-event-id"))
+        after_seq = last_seq if last_turn_id == turn.turn_id else 0
+        return _sse_response(turn, after_seq)
+
+    turn = start_turn(
+        message.user_id,
+        message.thread_id,
+        lambda turn: run_chat_turn(turn, message),
+        turn_id=message.turn_id if not turn else None,
+    )
+    return _sse_response(turn)
+
+
+@app.get("/chat/resume")
+async def resume_chat(request: Request, user_id: str, last_event_id: Optional[str] = None):
+    """Replay the frames of a turn the client missed, then continue live."""
+    turn_id, after_seq = parse_last_event_id(request.headers.get("last-event-id") or last_event_id)
+    turn = get_turn(turn_id)
+    if not turn or turn.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Unknown or expired turn")
+    return _sse_response(turn, after_seq)
+
+
+def _sse_response(turn, after_seq: int = 0) -> StreamingResponse:
+    return StreamingResponse(
+        stream_frames(turn, after_seq),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Turn-Id": turn.turn_id},
+    )
+
+
+async def run_chat_turn(turn, message: ChatMessage):
+    # Importing the agent stack here would block the event loop, and every other
+    # stream with it, for seconds; let the warm-up finish importing it off-loop
+    await warmup.wait_ready()
+    from agents import ItemHelpers, MessageOutputItem, Runner, TResponseInputItem, trace
+    from openai.types.responses import ResponseTextDeltaEvent
+    from offline_model import run_config  # MODEL_PROVIDER=offline swaps in the scripted model
+    from run_agents.triage_agent import triage_agent
+
+    input_items: List[TResponseInputItem] = get_conversation(message.user_id, message.thread_id)
     user_info = UserInfo(user_id=message.user_id, thread_id=message.thread_id)
     context = user_info
     user_input = message.message
@@ -111,46 +162,40 @@ async def chat(message: ChatMessage):
     current_agent = triage_agent
     current_assistant_message = ""  # full response buffer
 
-    async def generate_stream():
-        nonlocal current_agent, current_assistant_message
-
-        with trace("travel service", group_id=message.thread_id):
-            result = Runner.run_streamed(current_agent, input_items, context=context)
+    with trace("travel service", group_id=message.thread_id):
+        result = Runner.run_streamed(current_agent, input_items, context=context, run_config=run_config())
 
-            async for event in result.stream_events():
-                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-                    chunk = event.data.delta
-                    print(f"Sending to frontend: {repr(chunk)}")  # debug log
-                    current_assistant_message += chunk
-                    # Send as regular text chunk
-                    yield f"data: {json.dumps({'type': 'text', 'content': chunk})}\n\n"
-                    await asyncio.sleep(0)
+        async for event in result.stream_events():
+            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                chunk = event.data.delta
+                print(f"Sending to frontend: {repr(chunk)}")  # debug log
+                current_assistant_message += chunk
+                # Send as regular text chunk
+                await turn.publish({'type': 'text', 'content': chunk})
 
-                elif event.type == "agent_updated_stream_event":
-                    print(f"Handed off to {event.new_agent.name}")
-                    current_agent = event.new_agent
-                    for item in result.new_items:
-                        if isinstance(item, MessageOutputItem):
-                            assistant_reply = ItemHelpers.text_message_output(item)
-                            input_items.append({"role": "assistant", "content": assistant_reply})
+            elif event.type == "agent_updated_stream_event":
+                print(f"Handed off to {event.new_agent.name}")
+                current_agent = event.new_agent
+                for item in result.new_items:
+                    if isinstance(item, MessageOutputItem):
+                        assistant_reply = ItemHelpers.text_message_output(item)
+                        input_items.append({"role": "assistant", "content": assistant_reply})
 
-                    input_items.append({"role": "user", "content": user_input})
-                    result = Runner.run_streamed(current_agent, input_items, context=context)
+                input_items.append({"role": "user", "content": user_input})
+                result = Runner.run_streamed(current_agent, input_items, context=context, run_config=run_config())
 
-                elif event.type == "run_item_stream_event":
-                    if isinstance(event.item, MessageOutputItem):
-                        output_text = ItemHelpers.text_message_output(event.item)
-                        input_items.append({"role": "assistant", "content": output_text})
+            elif event.type == "run_item_stream_event":
+                if isinstance(event.item, MessageOutputItem):
+                    output_text = ItemHelpers.text_message_output(event.item)
+                    input_items.append({"role": "assistant", "content": output_text})
 
-            # Save in store
-            if current_assistant_message.strip():
-                input_items.append({"role": "assistant", "content": current_assistant_message})
-            conversation_store[message.thread_id] = input_items
+        # Save in store
+        if current_assistant_message.strip():
+            input_items.append({"role": "assistant", "content": current_assistant_message})
+        save_conversation(message.user_id, message.thread_id, input_items)
 
-            # Send final message with a special type
-            yield f"data: {json.dumps({'type': 'final', 'content': current_assistant_message})}\n\n"
-
-    return StreamingResponse(generate_stream(), media_type="text/event-stream")
+        # Send final message with a special type
+        await turn.publish({'type': 'final', 'content': current_assistant_message})
 
 
 
@@ -159,6 +204,7 @@ def clear_chat_context(user_id: str, thread_id: str):
     """Optional utility endpoint to clear conversation memory."""
     try:
         clear_context(user_id, thread_id)
+        clear_conversation(user_id, thread_id)
         logger.info(f"Cleared context for user_id={user_id}, thread_id={thread_id}")
         return {"status": "context cleared"}
     except Exception as e:
@@ -167,10 +213,107 @@ def clear_chat_context(user_id: str, thread_id: str):
 
 
 
+@app.get("/metrics/context")
+def get_context_metrics(top: int = 20):
+    """Entry and byte gauges for the in-memory context store."""
+    return context_stats(top=top)
+
+
+@app.get("/metrics/booking_cache")
+def get_booking_cache_metrics():
+    """Hit/miss/invalidation counters for the last-booking cache."""
+    return booking_cache.cache_stats()
+
+
+@app.get("/metrics/booking_queue")
+def get_booking_queue_metrics():
+    """Bookings confirmed to users but not yet committed to the database."""
+    return booking_queue.queue_stats()
+
+
+@app.get("/metrics/tool_output")
+def get_tool_output_metrics():
+    """Per-tool output sizes and how often the output guard had to truncate."""
+    return guard_stats()
+
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 until the background warm-up has loaded the agent stack."""
+    if not warmup.is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming up"})
+    return {"status": "ready"}
+
+
+@app.get("/metrics/startup")
+async def get_startup_metrics():
+    """Import time of the app itself and of each module the warm-up loaded."""
+    return warmup.startup_stats(_APP_IMPORT_SECONDS)
+
+
+@app.get("/metrics/process")
+async def get_process_metrics():
+    """Resident memory and event-loop load of this worker, sampled by loadtest.py."""
+    return process_stats()
+
+
+def _etag_json_response(request: Request, payload, etag: Optional[str] = None):
+    """Compact JSON with an ETag; answers a matching If-None-Match with 304. Hashes the body if no etag is given."""
+    body = json.dumps(payload, separators=(",", ":"))
+    if etag is None:
+        etag = f'W/"{hashlib.sha1(body.encode("utf-8")).hexdigest()[:20]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/history")
-async def get_history(user_id: str, thread_id: str = "default"):
+async def get_history(request: Request, user_id: str, thread_id: str, before: Optional[int] = None, limit: int = 50):
+    """Page backwards through a thread's transcript; pass `next_cursor` as `before` for older items."""
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing required parameter: user_id")
+    limit = max(1, min(limit, 200))
+
+    page = get_history_page(user_id, thread_id, before=before, limit=limit)
+    etag = page.pop("etag")
+    return _etag_json_response(request, page, etag)
+
+
+async def _booking_page(request: Request, kind: str, user_id: str, cursor: Optional[str], limit: int, details: bool):
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing required parameter: user_id")
+    try:
+        page = await list_bookings(kind, user_id, cursor=cursor, limit=limit, details=details)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _etag_json_response(request, page)
+
+
+@app.get("/bookings/flights")
+async def get_flight_bookings(request: Request, user_id: str, cursor: Optional[str] = None, limit: int = 20, details: bool = False):
+    """A user's flight bookings, newest first; pass `next_cursor` back as `cursor` for the next page."""
+    return await _booking_page(request, "flight", user_id, cursor, limit, details)
+
+
+@app.get("/bookings/accommodations")
+async def get_accommodation_bookings(request: Request, user_id: str, cursor: Optional[str] = None, limit: int = 20, details: bool = False):
+    """A user's accommodation bookings, newest first; images and amenities only with details=true."""
+    return await _booking_page(request, "accommodation", user_id, cursor, limit, details)
+
+
+@app.get("/bookings/upcoming")
+async def get_upcoming_trips(request: Request, user_id: str, within_days: Optional[int] = None, limit: int = 20):
+    """A user's flight legs that haven't departed yet, soonest first; `within_days` bounds the window."""
+    if not user_id:
+        raise HTTPException(status_code=400, detail="Missing required parameter: user_id")
+    return _etag_json_response(request, await list_upcoming_trips(user_id, within_days=within_days, limit=limit))
+
 
-    convo = get_context(user_id, thread_id, "convo") or []
-    return {"history": convo}
+_APP_IMPORT_SECONDS = time.perf_counter() - _APP_IMPORT_STARTED
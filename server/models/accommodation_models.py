@@ -26,6 +26,7 @@ class PriceBreakdown(BaseModel):
     base_rate_per_person: float
     adults: PriceBreakdownEntry
     children: Optional[PriceBreakdownEntry] = None
+    taxes: Optional[float] = None
     total_price: float
 
 class GpsCoordinates(BaseModel):
@@ -68,7 +69,7 @@ class SearchAccommodationOutput(BaseModel):
 
 
 class BookAccommodationInput(BaseModel):
-    selected_accommodation_id:str
+    selected_accommodation_id: str = Field(description="Option id, property token, or the option number shown to the user (e.g. 'option 2')")
     selected_accommodation_details: Optional[List[AccommodationOption]] = None 
     email: Optional[str] = None
     phone: Optional[str] = None
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -11,7 +12,7 @@ class FlightBooking(Base):
     id = Column(String, primary_key=True)  # UUID
     user_id = Column(String, nullable=False)
     thread_id = Column(String, nullable=False)
-    booking_reference = Column(String, nullable=False)
+    booking_reference = Column(String, nullable=False, unique=True, index=True)
 
     full_name = Column(String, nullable=False)
     passenger_names = Column(JSON, nullable=False)
@@ -28,6 +29,14 @@ class FlightBooking(Base):
     is_multi_city = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     price_breakdown = Column(JSON, nullable=True)
+    # Denormalized legs/segments/layovers written at booking time, so showing
+    # a booking is a single-row read; older rows fall back to the relations
+    itinerary_snapshot = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
+
+    __table_args__ = (
+        # "Latest booking for this user" lookups
+        Index("ix_flight_bookings_user_created", user_id, created_at.desc(), id.desc()),
+    )
 
     legs = relationship("FlightLegDB", back_populates="booking", cascade="all, delete-orphan")
     segments = relationship("FlightSegmentDB", back_populates="booking", cascade="all, delete-orphan")
@@ -37,15 +46,23 @@ class FlightLegDB(Base):
     __tablename__ = "flight_legs"
 
     id = Column(String, primary_key=True)  # UUID
-    booking_id = Column(String, ForeignKey("flight_bookings.id"), nullable=False)
+    booking_id = Column(String, ForeignKey("flight_bookings.id"), nullable=False, index=True)
 
     departure_date_time = Column(String, nullable=False)
     arrival_date_time = Column(String, nullable=False)
+    # Typed copies of the strings above for range queries (airport-local wall clock, no zone)
+    departure_at = Column(DateTime, nullable=True)
+    arrival_at = Column(DateTime, nullable=True)
     origin = Column(String, nullable=False)
     destination = Column(String, nullable=False)
     total_duration = Column(String, nullable=True)
     stops = Column(Integer, nullable=True)
 
+    __table_args__ = (
+        Index("ix_flight_legs_booking_departure", booking_id, departure_at),
+        Index("ix_flight_legs_departure_at", departure_at),
+    )
+
     booking = relationship("FlightBooking", back_populates="legs")
     segments = relationship("FlightSegmentDB", back_populates="leg", cascade="all, delete-orphan")
     layovers = relationship("LayoverDB", back_populates="leg", cascade="all, delete-orphan")
@@ -54,14 +71,16 @@ class FlightSegmentDB(Base):
     __tablename__ = "flight_segments"
 
     id = Column(String, primary_key=True)  # UUID
-    booking_id = Column(String, ForeignKey("flight_bookings.id"), nullable=False)
-    leg_id = Column(String, ForeignKey("flight_legs.id"), nullable=False)
+    booking_id = Column(String, ForeignKey("flight_bookings.id"), nullable=False, index=True)
+    leg_id = Column(String, ForeignKey("flight_legs.id"), nullable=False, index=True)
 
     segment_number = Column(Integer, nullable=False)
     departure_airport = Column(String, nullable=False)
     departure_datetime = Column(String, nullable=False)
     arrival_airport = Column(String, nullable=False)
     arrival_datetime = Column(String, nullable=False)
+    departure_at = Column(DateTime, nullable=True)
+    arrival_at = Column(DateTime, nullable=True)
     duration = Column(String, nullable=False)
     cabin_class = Column(String, nullable=False)
     extension_info = Column(JSON, nullable=True)  # List of strings
@@ -75,8 +94,8 @@ class LayoverDB(Base):
     __tablename__ = "layovers"
 
     id = Column(String, primary_key=True)  # UUID
-    booking_id = Column(String, ForeignKey("flight_bookings.id"), nullable=False)
-    leg_id = Column(String, ForeignKey("flight_legs.id"), nullable=False)
+    booking_id = Column(String, ForeignKey("flight_bookings.id"), nullable=False, index=True)
+    leg_id = Column(String, ForeignKey("flight_legs.id"), nullable=False, index=True)
 
     layover_airport = Column(String, nullable=False)
     layover_duration = Column(String, nullable=False)
@@ -115,4 +134,8 @@ class AccommodationBooking(Base):
     accommodation_location = Column(JSON)  # Store GPS coordinates
     
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_accommodation_bookings_user_created", user_id, created_at.desc(), id.desc()),
+    )
\ No newline at end of file
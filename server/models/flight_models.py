@@ -18,6 +18,7 @@ class PriceBreakdown(BaseModel):
     adults: PriceBreakdownEntry
     children: Optional[PriceBreakdownEntry] = None
     infants: Optional[PriceBreakdownEntry] = None
+    taxes: Optional[float] = None
     total_price: float
 
 # --- Input for Searching Flights ---
@@ -30,7 +31,10 @@ class SearchFlightInput(BaseModel):
     adults: int = Field(default=1, ge=0)
     children: int = Field(default=0, ge=0)
     infants: int = Field(default=0, ge=0)
-    max_price: Optional[float] = None
+    max_price: Optional[float] = Field(
+        default=None,
+        description="Highest fare per person for the whole itinerary, as quoted by the airline, before the party total and taxes",
+    )
     nonstop_only: Optional[bool] = False
     allowed_airlines: Optional[List[str]] = None
     excluded_airlines: Optional[List[str]] = None
@@ -82,11 +86,27 @@ class PriceCalculationInput(BaseModel):
     include_flight: Optional[bool] = True
     include_accommodation: Optional[bool] = True
 
+class TripPriceInput(BaseModel):
+    flight_option: Optional[str] = Field(
+        default=None,
+        description="Flight to price: option id, booking token or display ordinal ('2', 'second'). Defaults to the booked flight.",
+    )
+    accommodation_option: Optional[str] = Field(
+        default=None,
+        description="Accommodation to price: option id, property token or display ordinal. Defaults to the booked accommodation.",
+    )
+    include_flight: bool = True
+    include_accommodation: bool = True
+
 class BreakdownDetail(BaseModel):
     flight_cost: Optional[float] = None
     accommodation_cost: Optional[float] = None
     taxes_and_fees: Optional[float] = None
     currency: str = "USD"
+    travelers: Optional[int] = None
+    per_traveler_cost: Optional[float] = None
+    nights: Optional[int] = None
+    per_night_cost: Optional[float] = None
 
 class PriceCalculationOutput(BaseModel):
     total_cost: float
@@ -124,7 +144,7 @@ class SearchFlightOutput(BaseModel):
 
 # --- Input/Output for Booking a Flight ---
 class BookFlightInput(BaseModel):
-    selected_flight_id:str
+    selected_flight_id: str = Field(description="Option id, booking token, or the option number shown to the user (e.g. 'option 2')")
     selected_flight_details: Optional[List[FlightOption]] = None 
     email: Optional[str] = None
     phone: Optional[str] = None
@@ -0,0 +1,33 @@
+from typing import Optional, List
+from pydantic import BaseModel, Field
+
+from models.flight_models import FlightOption
+from models.accommodation_models import AccommodationOption
+
+# --- Combined flight + accommodation search ---
+class PlanTripInput(BaseModel):
+    origin: str = Field(description="Departure airport IATA code")
+    destination: str = Field(description="Arrival airport IATA code")
+    destination_city: Optional[str] = Field(
+        default=None, description="Where to look for accommodation; defaults to the destination"
+    )
+    departure_date: str  # Format: YYYY-MM-DD
+    return_date: Optional[str] = None  # Format: YYYY-MM-DD; omit for one-way
+    nights: Optional[int] = Field(default=None, ge=1, description="Length of stay when there is no return flight")
+    cabin_class: str = "economy"
+    adults: int = Field(default=1, ge=1)
+    children: int = Field(default=0, ge=0)
+    children_ages: Optional[List[int]] = None
+    infants: int = Field(default=0, ge=0)
+    max_flight_price: Optional[float] = Field(
+        default=None, description="Highest flight fare per person, before the party total and taxes"
+    )
+    max_price_per_night: Optional[float] = None
+
+class PlanTripOutput(BaseModel):
+    flights: List[FlightOption] = []
+    accommodation: List[AccommodationOption] = []
+    check_in_date: str
+    check_out_date: str
+    formatted_summary: str
+    errors: List[str] = []
@@ -0,0 +1,298 @@
+# server/offline_model.py
+#
+# A scripted stand-in for the OpenAI model, so the whole stack (SSE streaming,
+# handoffs, tools, booking queue, DB) can be load-tested without paying for or
+# being rate-limited by a real LLM:
+#
+#     MODEL_PROVIDER=offline SERP_API_URL=http://localhost:8001/search.json uvicorn main:app
+#
+# Decisions are simple keyword rules over the latest user message and the
+# tools/handoffs the current agent offers. The built-in rules follow the
+# loadtest.py scenarios end to end: triage hands off by topic (taken from
+# earlier messages when the latest has none), and the flight and
+# accommodation agents search, book and look up bookings. Text replies are streamed as
+# ResponseTextDeltaEvents at OFFLINE_TOKENS_PER_SECOND after an
+# OFFLINE_FIRST_TOKEN_LATENCY_MS delay, like a real model would.
+#
+# OFFLINE_SCRIPT may point at a JSON file of extra rules, checked first:
+#     [{"match": "hotel", "tool": "search_accommodation", "arguments": {...}},
+#      {"match": "thanks", "text": "You're welcome!"}]
+
+import asyncio
+import json
+import logging
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails, ResponseUsage
+
+from agents import ModelProvider, RunConfig
+from agents.items import ModelResponse
+from agents.models.interface import Model
+from agents.usage import Usage
+
+logger = logging.getLogger("chat_logger")
+
+OFFLINE_TOKENS_PER_SECOND = float(os.getenv("OFFLINE_TOKENS_PER_SECOND", "50"))
+OFFLINE_FIRST_TOKEN_LATENCY_MS = float(os.getenv("OFFLINE_FIRST_TOKEN_LATENCY_MS", "300"))
+OFFLINE_SCRIPT = os.getenv("OFFLINE_SCRIPT")
+
+DEFAULT_REPLY = "Sure! Where would you like to travel, and on which dates?"
+TOOL_REPLY = "Here is what I found. Let me know which option you'd like, or if I should search again."
+
+
+def _load_script():
+    if not OFFLINE_SCRIPT:
+        return []
+    with open(OFFLINE_SCRIPT, encoding="utf-8") as f:
+        rules = json.load(f)
+    logger.info(f"Loaded {len(rules)} offline model rules from {OFFLINE_SCRIPT}")
+    return rules
+
+
+def _content_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content or [] if isinstance(part, dict))
+
+
+def _last_user_turn(input):
+    """The latest user message, and whether a tool (not a handoff) has answered since."""
+    if isinstance(input, str):
+        return input, False
+    for i in range(len(input) - 1, -1, -1):
+        item = input[i]
+        if isinstance(item, dict) and item.get("role") == "user":
+            later = [x for x in input[i + 1:] if isinstance(x, dict)]
+            tool_calls = {
+                x.get("call_id") for x in later
+                if x.get("type") == "function_call" and not x.get("name", "").startswith("transfer_to_")
+            }
+            answered = any(
+                x.get("type") == "function_call_output" and x.get("call_id") in tool_calls for x in later
+            )
+            return _content_text(item.get("content")), answered
+    return "", False
+
+
+def _tool_names(tools):
+    return {getattr(tool, "name", None) for tool in tools}
+
+
+_TOPICS = {
+    "flight": re.compile(r"\b(flights?|fly|flying|airport)\b"),
+    "accommodation": re.compile(r"\b(hotels?|stay|accommodation|room|check(ing)?[ -]in|nights?)\b"),
+}
+_LOOKUP_RE = re.compile(r"\b(what did i|my last|my booking|just booked?)\b")
+_BOOK_RE = re.compile(r"\bbook\b")
+_PRICE_RE = re.compile(r"\b(how much|cost|total price)\b")
+
+
+def _topic_of(text):
+    for topic, pattern in _TOPICS.items():
+        if pattern.search(text):
+            return topic
+    return None
+
+
+def _user_messages(input):
+    if isinstance(input, str):
+        return [input]
+    return [
+        _content_text(item.get("content")) for item in input
+        if isinstance(item, dict) and item.get("role") == "user"
+    ]
+
+
+def _topic(input, text):
+    """What the latest message is about: its own keywords, else the most recent earlier message's."""
+    topic = _topic_of(text)
+    if topic:
+        return topic, True
+    for earlier in reversed(_user_messages(input)):
+        topic = _topic_of(earlier.lower())
+        if topic:
+            return topic, False
+    return None, False
+
+
+def _days_ahead(days):
+    return (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+_CONTACT = {"full_name": "Load Test", "email": "loadtest@example.com", "phone": "+254700000000"}
+
+# topic -> (search tool, arguments), (book tool, arguments), (lookup tool, arguments)
+_ACTIONS = {
+    "flight": (
+        ("search_flight", lambda: {"data": {"origin": "NBO", "destination": "MBA", "departure_date": _days_ahead(30), "adults": 1}}),
+        ("book_flight", lambda: {"input": dict(_CONTACT, selected_flight_id="option 1", passenger_count=1,
+                                               passenger_names=["Load Test"])}),
+        ("retrieve_last_booking_flight_details", lambda: {"input": {"user_id": "", "thread_id": ""}}),
+    ),
+    "accommodation": (
+        ("search_accommodation", lambda: {"data": {"location": "Mombasa", "check_in_date": _days_ahead(30),
+                                                   "check_out_date": _days_ahead(33), "adults": 2, "children": 0}}),
+        ("book_accommodation", lambda: {"input": dict(_CONTACT, selected_accommodation_id="option 1", guest_count=1,
+                                                      guest_names=["Load Test"])}),
+        ("get_last_accommodation_booking", lambda: {}),
+    ),
+}
+
+
+class OfflineModel(Model):
+    """Rule-based Model: calls a tool, hands off, or streams a canned reply."""
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else _load_script()
+
+    def _decide(self, input, tools, handoffs):
+        """Either ("text", reply) or ("call", tool name, arguments)."""
+        text, tool_answered = _last_user_turn(input)
+        if tool_answered:
+            return "text", TOOL_REPLY
+        lowered = text.lower()
+        names = _tool_names(tools)
+
+        for rule in self.rules:
+            if not re.search(rule.get("match", ""), lowered):
+                continue
+            if "tool" in rule and rule["tool"] in names:
+                return "call", rule["tool"], rule.get("arguments", {})
+            if "handoff" in rule:
+                for handoff in handoffs:
+                    if handoff.agent_name == rule["handoff"]:
+                        return "call", handoff.tool_name, {}
+            if "text" in rule:
+                return "text", rule["text"]
+
+        # The scripted conversations in loadtest.py: search, book and look up
+        # bookings in the agent that has the tool, handing off to it from triage
+        topic, explicit = _topic(input, lowered)
+        if _PRICE_RE.search(lowered) and "calculate_trip_price" in names:
+            return "call", "calculate_trip_price", {"input": {"flight_option": "1", "accommodation_option": "1"}}
+        if topic:
+            search, book, lookup = _ACTIONS[topic]
+            if _LOOKUP_RE.search(lowered):
+                action = lookup
+            elif _BOOK_RE.search(lowered):
+                action = book
+            else:
+                action = search if explicit else None
+            if action and action[0] in names:
+                return "call", action[0], action[1]()
+            for handoff in handoffs:
+                if ("flight" in handoff.agent_name.lower()) == (topic == "flight"):
+                    return "call", handoff.tool_name, {}
+        return "text", DEFAULT_REPLY
+
+    @staticmethod
+    def _output(decision):
+        if decision[0] == "call":
+            _, name, arguments = decision
+            return ResponseFunctionToolCall(
+                id=f"fc_{uuid.uuid4().hex}",
+                call_id=f"call_{uuid.uuid4().hex}",
+                type="function_call",
+                name=name,
+                arguments=json.dumps(arguments),
+                status="completed",
+            )
+        return ResponseOutputMessage(
+            id=f"msg_{uuid.uuid4().hex}",
+            type="message",
+            role="assistant",
+            status="completed",
+            content=[ResponseOutputText(type="output_text", text=decision[1], annotations=[])],
+        )
+
+    @staticmethod
+    def _usage(system_instructions, input, decision):
+        # Rough chars/4 token counts, enough for per-run usage totals to move
+        prompt = len(system_instructions or "") + len(json.dumps(input, default=str))
+        completion = len(json.dumps(decision[1:], default=str))
+        return prompt // 4, completion // 4
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                           prompt=None):
+        decision = self._decide(input, tools, handoffs)
+        await asyncio.sleep(OFFLINE_FIRST_TOKEN_LATENCY_MS / 1000)
+        input_tokens, output_tokens = self._usage(system_instructions, input, decision)
+        return ModelResponse(
+            output=[self._output(decision)],
+            usage=Usage(requests=1, input_tokens=input_tokens, output_tokens=output_tokens,
+                        total_tokens=input_tokens + output_tokens),
+            response_id=None,
+        )
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, *, previous_response_id=None, conversation_id=None,
+                              prompt=None):
+        decision = self._decide(input, tools, handoffs)
+        output = self._output(decision)
+        sequence = 0
+        await asyncio.sleep(OFFLINE_FIRST_TOKEN_LATENCY_MS / 1000)
+
+        if decision[0] == "text":
+            delay = 1 / OFFLINE_TOKENS_PER_SECOND if OFFLINE_TOKENS_PER_SECOND > 0 else 0
+            for i, token in enumerate(re.findall(r"\S+\s*", decision[1])):
+                if i and delay:
+                    await asyncio.sleep(delay)
+                yield ResponseTextDeltaEvent(
+                    type="response.output_text.delta",
+                    item_id=output.id,
+                    output_index=0,
+                    content_index=0,
+                    delta=token,
+                    logprobs=[],
+                    sequence_number=sequence,
+                )
+                sequence += 1
+
+        input_tokens, output_tokens = self._usage(system_instructions, input, decision)
+        response = Response.model_construct(
+            id=f"resp_{uuid.uuid4().hex}",
+            object="response",
+            created_at=datetime.now().timestamp(),
+            model="offline",
+            output=[output],
+            parallel_tool_calls=False,
+            tool_choice="auto",
+            tools=[],
+            usage=ResponseUsage.model_construct(
+                input_tokens=input_tokens,
+                input_tokens_details=InputTokensDetails.model_construct(cached_tokens=0),
+                output_tokens=output_tokens,
+                output_tokens_details=OutputTokensDetails.model_construct(reasoning_tokens=0),
+                total_tokens=input_tokens + output_tokens,
+            ),
+        )
+        yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=sequence)
+
+
+class OfflineModelProvider(ModelProvider):
+    def __init__(self):
+        self._model = OfflineModel()
+
+    def get_model(self, model_name):
+        return self._model
+
+
+@lru_cache(maxsize=None)
+def run_config() -> RunConfig:
+    """RunConfig for Runner calls: the offline model when MODEL_PROVIDER=offline, else the defaults. Built once."""
+    if os.getenv("MODEL_PROVIDER", "openai").lower() == "offline":
+        return RunConfig(model_provider=OfflineModelProvider(), tracing_disabled=True)
+    return RunConfig()
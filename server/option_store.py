@@ -0,0 +1,132 @@
+# server/option_store.py
+#
+# Search results kept in the context store, one compact blob per option.
+# Each search's options are stored once under "<kind>_options" as an OptionSet
+# with id and token indexes; an option is only decoded when something asks for
+# it, and booking tools can resolve the user's pick without rescanning.
+
+import json
+import re
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # fall back to compact JSON
+    msgpack = None
+
+from in_memory_context import get_context, set_context
+
+# Blobs at least this large are zlib-compressed
+COMPRESS_MIN_BYTES = 512
+
+# Fields that identify an option upstream and may be quoted back instead of our id
+_TOKEN_FIELDS = ("booking_token", "property_token")
+
+_ORDINAL_WORDS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_ORDINAL_RE = re.compile(r"^(?:the\s+)?(?:option\s*#?\s*|#)?(\d+|[a-z]+)(?:st|nd|rd|th)?(?:\s+(?:one|option))?$")
+
+
+def _pack(obj) -> bytes:
+    if msgpack is not None:
+        raw = b"m" + msgpack.packb(obj, use_bin_type=True)
+    else:
+        raw = b"j" + json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(raw)
+    return raw
+
+
+def _unpack(blob: bytes):
+    if blob[:1] == b"z":
+        blob = zlib.decompress(blob[1:])
+    if blob[:1] == b"m":
+        return msgpack.unpackb(blob[1:], raw=False)
+    return json.loads(blob[1:])
+
+
+class OptionSet:
+    """The options returned by one search, packed once and indexed by id."""
+
+    __slots__ = ("kind", "blobs", "index", "tokens", "meta")
+
+    def __init__(self, kind: str, options: list, meta: dict = None):
+        self.kind = kind
+        self.blobs = [_pack(option) for option in options]
+        self.index = {option["id"]: position for position, option in enumerate(options)}
+        self.tokens = {
+            option[field]: position
+            for position, option in enumerate(options)
+            for field in _TOKEN_FIELDS
+            if option.get(field)
+        }
+        self.meta = meta or {}
+
+    def __len__(self):
+        return len(self.blobs)
+
+    def __iter__(self):
+        return (_unpack(blob) for blob in self.blobs)
+
+    @property
+    def nbytes(self):
+        return sum(len(blob) for blob in self.blobs)
+
+    def get(self, option_id: str):
+        position = self.index.get(option_id)
+        return None if position is None else _unpack(self.blobs[position])
+
+    def at(self, ordinal: int):
+        """The option shown to the user as number `ordinal` (1-based)."""
+        if 1 <= ordinal <= len(self.blobs):
+            return _unpack(self.blobs[ordinal - 1])
+        return None
+
+    def resolve(self, ref: str):
+        """Find an option by id, by booking/property token, or by display ordinal ("option 2", "second")."""
+        if not ref:
+            return None
+        ref = ref.strip()
+        position = self.index.get(ref)
+        if position is None:
+            position = self.tokens.get(ref)
+        if position is not None:
+            return _unpack(self.blobs[position])
+        return self.at(_parse_ordinal(ref) or 0)
+
+
+def _parse_ordinal(ref: str):
+    match = _ORDINAL_RE.match(ref.lower())
+    if not match:
+        return None
+    value = match.group(1)
+    return int(value) if value.isdigit() else _ORDINAL_WORDS.get(value)
+
+
+def _context_key(kind):
+    return f"{kind}_options"
+
+
+def store_options(user_id, thread_id, kind, options, meta=None) -> OptionSet:
+    option_set = OptionSet(kind, options, meta)
+    set_context(user_id, thread_id, _context_key(kind), option_set)
+    return option_set
+
+
+def get_option_set(user_id, thread_id, kind):
+    option_set = get_context(user_id, thread_id, _context_key(kind))
+    return option_set if isinstance(option_set, OptionSet) else None
+
+
+def get_option(user_id, thread_id, kind, option_id):
+    option_set = get_option_set(user_id, thread_id, kind)
+    return option_set.get(option_id) if option_set else None
+
+
+def resolve_option(user_id, thread_id, kind, ref):
+    option_set = get_option_set(user_id, thread_id, kind)
+    return option_set.resolve(ref) if option_set else None
@@ -0,0 +1,42 @@
+# server/process_metrics.py
+#
+# Cheap per-process gauges (no psutil): RSS from /proc where available,
+# falling back to the peak RSS getrusage reports.
+
+import asyncio
+import os
+import resource
+import sys
+import time
+
+_STARTED = time.time()
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def process_stats():
+    peak = _peak_rss_bytes()
+    try:
+        tasks = len(asyncio.all_tasks())
+    except RuntimeError:  # called outside the event loop
+        tasks = None
+    return {
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - _STARTED, 1),
+        "rss_bytes": _rss_bytes() or peak,
+        "peak_rss_bytes": peak,
+        "asyncio_tasks": tasks,
+    }
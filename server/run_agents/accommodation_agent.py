@@ -4,18 +4,17 @@ from models.flight_models import SearchFlightInput, SearchFlightOutput
 from models.accommodation_models import BookAccommodationInput,BookAccommodationInput
 
 from tools.book_flight import book_flight
-from run_agents.price_calculator_agent import price_calculator_agent
-from tools.parse_natural_date import parse_natural_date
+from tools.trip_pricing import calculate_trip_price
+from tools.parse_natural_date import parse_natural_date, parse_natural_dates
 from tools.retrieve_last_booking_flight_details import retrieve_last_booking_flight_details
 from tools.search_accommodation import search_accommodation
 from tools.book_accommodation import book_accommodation
 from tools.get_last_accommodation_booking import get_last_accommodation_booking
+from tools.get_option_details import get_option_details
+from tools.output_guard import guard_output
 
-from datetime import datetime
+from run_agents.instructions import with_runtime_context
 
-now_dt = datetime.now()
-current_time = now_dt.strftime('%Y-%m-%d %H:%M:%S')
-this_year = now_dt.year
 raw_instructions = """
 
 # 🏨 Accommodation Agent Instructions
@@ -47,10 +46,9 @@ for option in accommodation_results:
 
 
 ## 🕐 Date Understanding:
-Resolve natural date phrases (like “next Friday”, “14th August”) using the parse_natural_date tool if needed.
+Resolve natural date phrases (like “next Friday”, “14th August”) using the parse_natural_date tool if needed. When there are several (outbound and return, check-in and check-out, multi-city legs), resolve them all in one `parse_natural_dates` call.
 
-Assume current date and time is: **{{current_time}}**
-Assume current year is: **{{this_year}}** unless the date has passed.
+Use the current date and year from the **Runtime Context** section at the end of these instructions.
 
 ## Handling Incoming Handoffs
 
@@ -168,6 +166,7 @@ Use the `search_accommodation` tool with the confirmed user input to fetch avail
   - Amenities
   - Images
   - View More Details ancho text
+- If the output is a digest instead (`"truncated": true`, no `formatted_message`), present the options it lists in the same HTML style, and call `get_option_details` for any option the user wants to know more about.
 - Then Ask the user in a separate message which option they prefer or if they'd like to see more.
 
 Example of how to display:
@@ -461,19 +460,17 @@ has_booked_flight = get_context(user_id, thread_id, "has_booked_flight")
 
 """
 
-customized_instructions = raw_instructions.replace("{{current_time}}", current_time).replace("{{this_year}}", str(this_year))
+# Static text first so it stays cacheable; date and user are appended per run
+customized_instructions = with_runtime_context(raw_instructions)
 
 accommodation_agent = Agent(
     name="Accommodation Agent",
     instructions=customized_instructions,
     model="gpt-4o-mini",
-    tools=[parse_natural_date,search_accommodation,book_accommodation,get_last_accommodation_booking],
+    tools=[
+        guard_output(tool)
+        for tool in (parse_natural_date, parse_natural_dates, search_accommodation, book_accommodation,
+                     get_last_accommodation_booking, calculate_trip_price, get_option_details)
+    ],
     handoffs=[]
 )
-
-try:
-    from run_agents.price_calculator_agent import price_calculator_agent
-    
-    accommodation_agent.handoffs=[price_calculator_agent]
-except ImportError:
-    pass
\ No newline at end of file
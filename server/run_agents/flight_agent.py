@@ -2,15 +2,13 @@ from agents import Agent, Runner
 from tools.search_flight import search_flight
 from models.flight_models import SearchFlightInput, SearchFlightOutput
 from tools.book_flight import book_flight
-from run_agents.price_calculator_agent import price_calculator_agent
-from tools.parse_natural_date import parse_natural_date
+from tools.trip_pricing import calculate_trip_price
+from tools.parse_natural_date import parse_natural_date, parse_natural_dates
 from tools.retrieve_last_booking_flight_details import retrieve_last_booking_flight_details
+from tools.get_option_details import get_option_details
+from tools.output_guard import guard_output
 
-from datetime import datetime
-
-now_dt = datetime.now()
-current_time = now_dt.strftime('%Y-%m-%d %H:%M:%S')
-this_year = now_dt.year
+from run_agents.instructions import with_runtime_context
 
 raw_instructions = """
 
@@ -34,10 +32,9 @@ After a successful flight search store relevant details (destination, booking re
 
 
 🕐 Date Understanding:
-Resolve natural date phrases (like “next Friday”, “14th August”) using the parse_natural_date tool if needed.
+Resolve natural date phrases (like “next Friday”, “14th August”) using the parse_natural_date tool if needed. When there are several (outbound and return, check-in and check-out, multi-city legs), resolve them all in one `parse_natural_dates` call.
 
-Assume current date and time is:    {{current_time}}   
-Assume current year is:    {{this_year}}   unless the date has passed.
+Use the current date and year from the Runtime Context section at the end of these instructions.
 
 🧠 Handling Incoming Handoffs
 
@@ -493,6 +490,7 @@ Once all fields are verified, say:
 
 > ⚠️    IMPORTANT:   Agents must always display the full flight option details for each trip type (one-way, round-trip, multi-city) exactly as shown below.  
 > Do NOT only show the airline and price. All information — including route, times, duration, layovers, and pricing breakdown — must be included so the traveler can make an informed decision without needing to ask for more details.
+> If the `search_flight` output is a digest (`"truncated": true`), show each option from the fields the digest gives (route, times, stops, duration, price). Call `get_option_details` only for the option the user picks or asks about, not for every option shown.
 
 
 ---
@@ -1141,18 +1139,17 @@ The external tool failed to respond (timeout, server issue, etc.).
 """
 
 
-customized_instructions = raw_instructions.replace("{{current_time}}", current_time).replace("{{this_year}}", str(this_year))
+# Static text first so it stays cacheable; date and user are appended per run
+customized_instructions = with_runtime_context(raw_instructions)
 
 flight_agent = Agent(
     name="Flight Agent",
     instructions=customized_instructions,
     model="gpt-4o-mini",
-    tools=[search_flight, book_flight, parse_natural_date, retrieve_last_booking_flight_details],
+    tools=[
+        guard_output(tool)
+        for tool in (search_flight, book_flight, parse_natural_date, parse_natural_dates,
+                     retrieve_last_booking_flight_details, calculate_trip_price, get_option_details)
+    ],
     handoffs=[]
 )
-
-try:
-    from run_agents.price_calculator_agent import price_calculator_agent
-    flight_agent.handoffs = [price_calculator_agent]
-except ImportError:
-    pass
\ No newline at end of file
@@ -0,0 +1,45 @@
+# run_agents/instructions.py
+#
+# Agent instructions are sent in full on every model call. Keeping them as a
+# byte-identical static prefix with the per-run details (date, user) appended
+# at the very end lets provider-side prompt caching reuse the static part
+# across turns, users and deploys.
+
+from datetime import datetime
+
+from agents import RunContextWrapper
+
+from models.context_models import UserInfo
+
+RUNTIME_CONTEXT_HEADING = "## 🕐 Runtime Context"
+
+
+def _now():
+    return datetime.now()
+
+
+def runtime_context(user_info: UserInfo = None, now: datetime = None) -> str:
+    """The small per-run suffix: current date/year and who we're talking to."""
+    now = now or _now()
+    lines = [
+        RUNTIME_CONTEXT_HEADING,
+        f"Current date and time: {now.strftime('%Y-%m-%d %H:%M')}",
+        f"Current year: {now.year} (assume it for dates given without a year, unless the date has passed)",
+    ]
+    if user_info is not None:
+        lines.append(f"user_id: {user_info.user_id}")
+        lines.append(f"thread_id: {user_info.thread_id}")
+        if user_info.name:
+            lines.append(f"User name: {user_info.name}")
+    return "\n".join(lines)
+
+
+def with_runtime_context(static_instructions: str):
+    """Build an instructions callable: `static_instructions` verbatim, then the runtime context."""
+    static_instructions = static_instructions.strip()
+
+    def instructions(wrapper: RunContextWrapper[UserInfo], agent) -> str:
+        return f"{static_instructions}\n\n{runtime_context(wrapper.context)}\n"
+
+    instructions.static_prefix = static_instructions
+    return instructions
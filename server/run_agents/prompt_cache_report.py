@@ -0,0 +1,97 @@
+# run_agents/prompt_cache_report.py
+#
+# Reports, per agent, how much of each request is a stable (cacheable) prefix:
+#
+#     python -m run_agents.prompt_cache_report
+#
+# Instructions are rendered for two different users at two different times;
+# the prefix they share is what provider-side prompt caching can reuse. Tool
+# schemas are sent with every call too and count towards the prefix.
+# Exits non-zero if an agent's instructions vary before the runtime context.
+
+import asyncio
+import inspect
+import json
+import sys
+from datetime import datetime
+from unittest import mock
+
+from agents import RunContextWrapper
+
+from models.context_models import UserInfo
+from run_agents import instructions as instructions_module
+from run_agents.instructions import RUNTIME_CONTEXT_HEADING
+from token_count import TOKENIZER, count_tokens
+
+# OpenAI only caches prompts of at least this many tokens
+MIN_CACHEABLE_TOKENS = 1024
+
+
+async def _render(agent, user_info: UserInfo) -> str:
+    if not callable(agent.instructions):
+        return agent.instructions or ""
+    result = agent.instructions(RunContextWrapper(context=user_info), agent)
+    return await result if inspect.isawaitable(result) else result
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def _all_agents(root):
+    seen, stack = {}, [root]
+    while stack:
+        agent = stack.pop()
+        if agent.name in seen:
+            continue
+        seen[agent.name] = agent
+        stack.extend(h for h in agent.handoffs if hasattr(h, "instructions"))
+    return list(seen.values())
+
+
+async def report(root_agent):
+    users = [
+        (UserInfo(user_id="report-user-a", thread_id="thread-a"), datetime(2030, 1, 1, 8, 0)),
+        (UserInfo(user_id="report-user-b", thread_id="thread-b", name="B"), datetime(2031, 6, 15, 20, 30)),
+    ]
+    unstable = []
+    print(f"Token counts via {TOKENIZER}\n")
+    print(f"{'agent':<24}{'tools':>8}{'static':>9}{'dynamic':>9}{'cacheable':>11}  status")
+    for agent in _all_agents(root_agent):
+        renders = []
+        for user_info, now in users:
+            # Pin the clock so the two renders differ only where runtime context is injected
+            with mock.patch.object(instructions_module, "_now", lambda now=now: now):
+                renders.append(await _render(agent, user_info))
+
+        prefix_len = _common_prefix_length(*renders)
+        static_text = renders[0][:prefix_len]
+        dynamic_text = renders[0][prefix_len:]
+        tool_schemas = json.dumps(
+            [getattr(tool, "params_json_schema", {}) for tool in agent.tools], separators=(",", ":")
+        )
+        tool_tokens = count_tokens(tool_schemas)
+        static_tokens = count_tokens(static_text)
+        dynamic_tokens = count_tokens(dynamic_text)
+        cacheable = tool_tokens + static_tokens
+
+        # Anything dynamic must sit inside the runtime context at the very end
+        heading_at = renders[0].rfind(RUNTIME_CONTEXT_HEADING)
+        stable = not dynamic_text or (heading_at != -1 and prefix_len >= heading_at)
+        status = "ok" if stable else "UNSTABLE PREFIX"
+        if stable and cacheable < MIN_CACHEABLE_TOKENS:
+            status = f"ok (below {MIN_CACHEABLE_TOKENS}-token cache minimum)"
+        if not stable:
+            unstable.append(agent.name)
+        print(f"{agent.name:<24}{tool_tokens:>8}{static_tokens:>9}{dynamic_tokens:>9}{cacheable:>11}  {status}")
+    return unstable
+
+
+if __name__ == "__main__":
+    from run_agents.triage_agent import triage_agent
+
+    sys.exit(1 if asyncio.run(report(triage_agent)) else 0)
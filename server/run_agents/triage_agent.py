@@ -1,7 +1,11 @@
 from agents import Agent, Runner
 from run_agents.flight_agent import flight_agent
 from run_agents.accommodation_agent import accommodation_agent
-from run_agents.price_calculator_agent import price_calculator_agent
+from tools.trip_pricing import calculate_trip_price
+from tools.plan_trip import plan_trip
+from tools.parse_natural_date import parse_natural_date, parse_natural_dates
+from tools.output_guard import guard_output
+from tools.get_option_details import get_option_details
 
 
 async def triage_agent_run(user_id: str, thread_id: str, message: str):
@@ -23,7 +27,8 @@ Your primary role is to classify the user's request and forward it to one of the
 
 - ✈️     FlightAgent    : For booking flights, checking flight options, retrieving past flight bookings, or confirming flight details.
 - 🏨     AccommodationAgent    : For hotel bookings, accommodations, or lodging inquiries and past accommodation reservations.
-- 💰     PriceCalculator    : For calculating total trip costs (flight + accommodation), or costs for flight-only or accommodation-only.
+- 💰     calculate_trip_price tool    : For total trip costs (flight + accommodation), or costs for flight-only or accommodation-only. Call the tool yourself (no handoff) and show its `formatted_output`.
+- 🧳     plan_trip tool    : When the user wants BOTH a flight and accommodation at the destination and has given origin, destination, travel date and a return date or number of nights. Call the tool yourself (no handoff): it searches flights and stays together. Resolve relative dates first, all in one `parse_natural_dates` call, show its `formatted_summary` (if the output is a digest, `"truncated": true`, show the options it lists and call `get_option_details` only for an option the user asks about), then route to FlightAgent or AccommodationAgent to book the chosen options.
 
 📝 Important Formatting Rule:
 - Format all flight responses using raw HTML not Markdown.
@@ -217,9 +222,10 @@ AccommodationAgent: "I'm connecting you to the accommodation agent" ❌ WRONG -
 Examples:
 - "Book me a flight to Mombasa" → `FlightAgent`
 - "Find a hotel in Nairobi" → `AccommodationAgent`
-- "How much will the whole trip cost?" → `PriceCalculator`
-- "How much is the hotel per night?" → `PriceCalculator`
-- "What's the cost of the flight to Kisumu?" → `PriceCalculator`
+- "Flight from Nairobi to Mombasa on 12 Aug, back on the 19th, and a hotel there" → call `plan_trip`
+- "How much will the whole trip cost?" → call `calculate_trip_price`
+- "How much is the hotel per night?" → call `calculate_trip_price` with include_flight=false
+- "What's the cost of the flight to Kisumu?" → call `calculate_trip_price` with include_accommodation=false
 - "Show me my last booking” → Ask: flight or accommodation?
 - "I want to see my last flight booking" → Send to `FlightAgent` directly
 - "Retrieve my last flight reservation" → Send to `FlightAgent` directly
@@ -233,7 +239,8 @@ Examples:
 🤖 Be proactive, polite, and efficient. Avoid asking unnecessary follow-up questions when intent is clear.
 """,
 model="gpt-4o-mini",
-handoffs=[flight_agent, price_calculator_agent, accommodation_agent]  # Add accommodation_agent if needed
+tools=[calculate_trip_price, guard_output(plan_trip), guard_output(get_option_details), parse_natural_date, parse_natural_dates],
+handoffs=[flight_agent, accommodation_agent]
 )
 
    
@@ -0,0 +1,114 @@
+# server/serpapi_stub.py
+#
+# A local stand-in for SerpAPI's google_flights and google_hotels engines, for
+# load tests and offline development:
+#
+#     uvicorn serpapi_stub:app --port 8001
+#     SERP_API_URL=http://localhost:8001/search.json uvicorn main:app
+#
+# Responses are generated deterministically from the query, in the same shape
+# the search tools parse. STUB_LATENCY_MS adds a fixed delay per request.
+
+import asyncio
+import hashlib
+import os
+import random
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+STUB_RESULTS = int(os.getenv("STUB_RESULTS", "3"))
+
+AIRLINES = [("Kenya Airways", "KQ"), ("Jambojet", "JM"), ("Safarilink", "F2"), ("Fly540", "5H")]
+HOTEL_NAMES = ["Sarova Grand", "Serena Suites", "Acacia Lodge", "Baobab Beach Resort", "City Park Hotel"]
+
+app = FastAPI()
+
+
+def _rng(params) -> random.Random:
+    key = "&".join(f"{k}={params[k]}" for k in sorted(params) if k != "api_key")
+    return random.Random(int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:12], 16))
+
+
+def _day(value, fallback_days=30):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=fallback_days)
+
+
+def _flight_group(rng, origin, destination, day, index, with_departure_token):
+    airline, code = AIRLINES[index % len(AIRLINES)]
+    departure = day + timedelta(hours=6 + 3 * index, minutes=rng.choice([0, 15, 30, 45]))
+    duration = rng.randint(55, 180)
+    arrival = departure + timedelta(minutes=duration)
+    group = {
+        "flights": [{
+            "departure_airport": {"id": origin, "name": origin, "time": departure.strftime("%Y-%m-%d %H:%M")},
+            "arrival_airport": {"id": destination, "name": destination, "time": arrival.strftime("%Y-%m-%d %H:%M")},
+            "duration": duration,
+            "airline": airline,
+            "flight_number": f"{code} {rng.randint(100, 999)}",
+            "travel_class": "Economy",
+            "extensions": ["Carry-on bag included"],
+        }],
+        "layovers": [],
+        "total_duration": duration,
+        "price": rng.randint(80, 600),
+        "type": "Round trip" if with_departure_token else "One way",
+    }
+    token = hashlib.sha1(f"{origin}{destination}{departure}{index}".encode("utf-8")).hexdigest()[:24]
+    group["departure_token" if with_departure_token else "booking_token"] = token
+    return group
+
+
+def _google_flights(params):
+    rng = _rng(params)
+    origin, destination = params.get("departure_id", "NBO"), params.get("arrival_id", "MBA")
+    if params.get("departure_token"):
+        # Return leg of a round trip
+        day = _day(params.get("return_date"), 37)
+        groups = [_flight_group(rng, destination, origin, day, i, False) for i in range(STUB_RESULTS)]
+    else:
+        round_trip = str(params.get("type", "")) == "1" or bool(params.get("return_date"))
+        day = _day(params.get("outbound_date"))
+        groups = [_flight_group(rng, origin, destination, day, i, round_trip) for i in range(STUB_RESULTS)]
+    return {"search_metadata": {"status": "Success"}, "best_flights": groups[:2], "other_flights": groups[2:]}
+
+
+def _google_hotels(params):
+    rng = _rng(params)
+    properties = []
+    for i in range(STUB_RESULTS):
+        price = rng.randint(40, 400)
+        name = HOTEL_NAMES[(rng.randint(0, 99) + i) % len(HOTEL_NAMES)]
+        properties.append({
+            "type": "hotel",
+            "name": f"{name} {params.get('q', '')}".strip(),
+            "link": f"https://example.com/hotels/{i}",
+            "property_token": hashlib.sha1(f"{name}{i}{params.get('q')}".encode("utf-8")).hexdigest()[:20],
+            "gps_coordinates": {"latitude": -1.28 + rng.random() / 10, "longitude": 36.82 + rng.random() / 10},
+            "rate_per_night": {"lowest": f"${price}", "extracted_lowest": price},
+            "overall_rating": round(rng.uniform(3.0, 5.0), 1),
+            "reviews": rng.randint(10, 3000),
+            "hotel_class": f"{rng.randint(2, 5)}-star hotel",
+            "amenities": ["Free Wi-Fi", "Pool", "Breakfast"][: rng.randint(1, 3)],
+            "images": [{"thumbnail": f"https://example.com/hotels/{i}/thumb.jpg"}],
+        })
+    return {"search_metadata": {"status": "Success"}, "properties": properties}
+
+
+ENGINES = {"google_flights": _google_flights, "google_hotels": _google_hotels}
+
+
+@app.get("/search.json")
+async def search(request: Request):
+    params = dict(request.query_params)
+    if STUB_LATENCY_MS:
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    engine = ENGINES.get(params.get("engine"))
+    if engine is None:
+        return JSONResponse(status_code=400, content={"error": f"Unsupported engine: {params.get('engine')}"})
+    return engine(params)
@@ -0,0 +1,177 @@
+# server/snapshot.py
+#
+# Incremental snapshots of the in-memory conversation and context stores to a
+# local append-only file, so a restarted worker resumes threads instead of
+# redoing searches. Only threads changed since the last snapshot are written;
+# a deleted thread is written as a tombstone. The file is compacted to one
+# record per live thread once it grows well past the live data.
+#
+# Record layout: 4-byte big-endian length, 4-byte CRC32, pickled payload
+# (store, key, state). The file is only ever written by this process, so
+# unpickling it at startup is as trusted as the code itself. restore() locks it
+# (see file_lock.py); with several workers each needs its own STATE_SNAPSHOT_PATH.
+
+import asyncio
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import zlib
+
+import conversation_store
+from file_lock import lock_exclusive
+import in_memory_context
+
+logger = logging.getLogger("chat_logger")
+
+SNAPSHOT_PATH = os.getenv("STATE_SNAPSHOT_PATH", "state_snapshot.bin")
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("STATE_SNAPSHOT_INTERVAL_SECONDS", "5"))
+# Compact once the file is this many times larger than the live records
+COMPACT_RATIO = 4
+COMPACT_MIN_BYTES = 8 * 1024 * 1024
+
+_HEADER = struct.Struct(">II")
+
+# store name -> (drain_dirty, mark_dirty, all_keys, export, import)
+_STORES = {
+    "context": (
+        in_memory_context.drain_dirty,
+        in_memory_context.mark_dirty,
+        in_memory_context.thread_keys,
+        in_memory_context.export_thread,
+        in_memory_context.import_thread,
+    ),
+    "conversation": (
+        conversation_store.drain_dirty,
+        conversation_store.mark_dirty,
+        conversation_store.conversation_keys,
+        conversation_store.export_conversation,
+        conversation_store.import_conversation,
+    ),
+}
+
+_live_sizes = {}  # (store, key) -> size of its latest record on disk
+_write_lock = threading.Lock()
+
+
+def _encode(store, key, state) -> bytes:
+    payload = pickle.dumps((store, key, state), protocol=pickle.HIGHEST_PROTOCOL)
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _collect_dirty():
+    """Export every thread changed since the last call. Cheap: copies references only."""
+    records, drained = [], {}
+    for store, (drain_dirty, _, _, export, _) in _STORES.items():
+        keys = drained[store] = drain_dirty()
+        records.extend((store, key, export(key)) for key in keys)
+    return records, drained
+
+
+def _collect_all():
+    records = []
+    for store, (drain_dirty, _, all_keys, export, _) in _STORES.items():
+        drain_dirty()
+        for key in all_keys():
+            state = export(key)
+            if state is not None:
+                records.append((store, key, state))
+    return records
+
+
+def _append(records):
+    with _write_lock:
+        with open(SNAPSHOT_PATH, "ab") as f:
+            for store, key, state in records:
+                blob = _encode(store, key, state)
+                f.write(blob)
+                if state is None:
+                    _live_sizes.pop((store, key), None)
+                else:
+                    _live_sizes[(store, key)] = len(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        return os.path.getsize(SNAPSHOT_PATH)
+
+
+def _compact(records):
+    tmp_path = f"{SNAPSHOT_PATH}.tmp"
+    with _write_lock:
+        _live_sizes.clear()
+        with open(tmp_path, "wb") as f:
+            for store, key, state in records:
+                blob = _encode(store, key, state)
+                f.write(blob)
+                _live_sizes[(store, key)] = len(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, SNAPSHOT_PATH)
+    logger.info(f"Compacted state snapshot to {len(records)} records")
+
+
+def _needs_compaction(file_size):
+    return file_size > COMPACT_MIN_BYTES and file_size > COMPACT_RATIO * sum(_live_sizes.values())
+
+
+async def snapshot_once():
+    """Write changed threads; the pickling and disk I/O run off the event loop."""
+    records, drained = _collect_dirty()
+    if not records:
+        return
+    try:
+        file_size = await asyncio.to_thread(_append, records)
+    except Exception:
+        # Put the keys back so the next round retries them
+        for store, keys in drained.items():
+            _STORES[store][1](keys)
+        raise
+    if _needs_compaction(file_size):
+        await asyncio.to_thread(_compact, _collect_all())
+
+
+async def run_snapshotter():
+    """Background task: snapshot every SNAPSHOT_INTERVAL_SECONDS until cancelled."""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+        try:
+            await snapshot_once()
+        except Exception as e:
+            logger.error(f"State snapshot failed: {e}", exc_info=True)
+
+
+def restore():
+    """Load the snapshot file into the stores. Call once at startup, before serving."""
+    lock_exclusive(SNAPSHOT_PATH, "STATE_SNAPSHOT_PATH")
+    if not os.path.exists(SNAPSHOT_PATH) or os.path.getsize(SNAPSHOT_PATH) == 0:
+        return 0
+
+    latest = {}
+    good_until = 0
+    with open(SNAPSHOT_PATH, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        offset, end = 0, len(buf)
+        while offset + _HEADER.size <= end:
+            length, crc = _HEADER.unpack_from(buf, offset)
+            start = offset + _HEADER.size
+            payload = buf[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break  # torn write at the tail from a crash
+            store, key, state = pickle.loads(payload)
+            latest[(store, key)] = (state, _HEADER.size + length)
+            offset = good_until = start + length
+
+    if good_until < os.path.getsize(SNAPSHOT_PATH):
+        logger.warning(f"Truncating corrupt state snapshot tail at byte {good_until}")
+        with open(SNAPSHOT_PATH, "r+b") as f:
+            f.truncate(good_until)
+
+    restored = 0
+    for (store, key), (state, size) in latest.items():
+        if state is None:
+            continue
+        _STORES[store][4](key, state)
+        _live_sizes[(store, key)] = size
+        restored += 1
+    logger.info(f"Restored {restored} threads from state snapshot")
+    return restored
@@ -0,0 +1,132 @@
+# server/stream_buffer.py
+#
+# Per-turn ring buffers for the /chat SSE stream. Every frame of a turn gets a
+# sequence number and is kept in a bounded deque so a client that drops its
+# connection can reconnect with `Last-Event-ID` and pick up where it left off,
+# while the agent run itself keeps going in the background.
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional, Tuple
+
+logger = logging.getLogger("chat_logger")
+
+MAX_EVENTS_PER_TURN = int(os.getenv("SSE_RING_BUFFER_SIZE", "512"))
+FINISHED_TURN_TTL_SECONDS = int(os.getenv("SSE_TURN_TTL_SECONDS", "300"))
+
+_turns: dict[str, "TurnStream"] = {}
+
+
+class TurnStream:
+    def __init__(self, turn_id: str, user_id: str, thread_id: str, maxlen: int = MAX_EVENTS_PER_TURN):
+        self.turn_id = turn_id
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.events: deque = deque(maxlen=maxlen)  # (seq, payload)
+        self.next_seq = 1
+        # Text of frames that have already fallen out of the ring, so a client
+        # that reconnects too late still gets the full message as a snapshot.
+        self.evicted_text = ""
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._cond = asyncio.Condition()
+
+    async def publish(self, payload: dict) -> int:
+        async with self._cond:
+            seq = self.next_seq
+            self.next_seq += 1
+            if len(self.events) == self.events.maxlen:
+                _, dropped = self.events[0]
+                if dropped.get("type") == "text":
+                    self.evicted_text += dropped["content"]
+            self.events.append((seq, payload))
+            self._cond.notify_all()
+            return seq
+
+    async def close(self) -> None:
+        async with self._cond:
+            self.done = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncIterator[Tuple[int, dict]]:
+        """Replay buffered frames newer than `after_seq`, then follow the live stream."""
+        cursor = after_seq
+        while True:
+            async with self._cond:
+                oldest = self.events[0][0] if self.events else self.next_seq
+                batch = []
+                if cursor + 1 < oldest:
+                    batch.append((oldest - 1, {"type": "snapshot", "content": self.evicted_text}))
+                    cursor = oldest - 1
+                batch.extend((seq, payload) for seq, payload in self.events if seq > cursor)
+                if not batch:
+                    if self.done:
+                        return
+                    await self._cond.wait()
+                    continue
+
+            for seq, payload in batch:
+                yield seq, payload
+            cursor = batch[-1][0]
+
+
+def format_frame(turn_id: str, seq: int, payload: dict) -> str:
+    return f"id: {turn_id}:{seq}\ndata: {json.dumps(payload)}\n\n"
+
+
+def parse_last_event_id(value: Optional[str]) -> Tuple[Optional[str], int]:
+    """Split a `Last-Event-ID` of the form `<turn_id>:<seq>`."""
+    if not value or ":" not in value:
+        return None, 0
+    turn_id, _, seq = value.rpartition(":")
+    try:
+        return turn_id, int(seq)
+    except ValueError:
+        return turn_id, 0
+
+
+def _prune_finished() -> None:
+    cutoff = time.time() - FINISHED_TURN_TTL_SECONDS
+    for turn_id in [t for t, turn in _turns.items() if turn.done and turn.finished_at < cutoff]:
+        _turns.pop(turn_id, None)
+
+
+def get_turn(turn_id: Optional[str]) -> Optional[TurnStream]:
+    if not turn_id:
+        return None
+    return _turns.get(turn_id)
+
+
+def start_turn(user_id: str, thread_id: str, producer, turn_id: Optional[str] = None) -> TurnStream:
+    """Register a new turn and run `producer(turn)` in the background.
+
+    The producer publishes frames into the turn; it is not tied to any HTTP
+    connection, so a client disconnect doesn't cancel the agent run.
+    """
+    _prune_finished()
+    turn = TurnStream(turn_id or uuid.uuid4().hex, user_id, thread_id)
+    _turns[turn.turn_id] = turn
+
+    async def _run():
+        try:
+            await producer(turn)
+        except Exception as e:
+            logger.error(f"Turn {turn.turn_id} failed: {e}", exc_info=True)
+            await turn.publish({"type": "error", "content": str(e)})
+        finally:
+            await turn.close()
+
+    turn.task = asyncio.create_task(_run())
+    return turn
+
+
+async def stream_frames(turn: TurnStream, after_seq: int = 0) -> AsyncIterator[str]:
+    async for seq, payload in turn.subscribe(after_seq):
+        yield format_frame(turn.turn_id, seq, payload)
@@ -0,0 +1,22 @@
+# server/token_count.py
+#
+# Token counting shared by the prompt-cache report and the tool-output guard:
+# exact with tiktoken when it's installed, a chars/4 estimate otherwise.
+
+try:
+    import tiktoken
+
+    _encoding = None
+
+    def count_tokens(text: str) -> int:
+        global _encoding
+        if _encoding is None:  # loading the BPE ranks is slow; do it on first use
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+
+    TOKENIZER = "tiktoken o200k_base"
+except ImportError:  # rough estimate without tiktoken
+    def count_tokens(text: str) -> int:
+        return (len(text) + 3) // 4
+
+    TOKENIZER = "chars/4 estimate"
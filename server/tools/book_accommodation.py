@@ -1,11 +1,12 @@
-from db.session import SessionLocal
+import booking_queue
 from models.db_models import AccommodationBooking
 from agents import function_tool, RunContextWrapper
 from models.context_models import UserInfo
 import uuid
 import logging
 from models.accommodation_models import BookAccommodationInput, BookAccommodationOutput
-from in_memory_context import set_context, get_context
+from in_memory_context import set_context, get_context, compare_and_set
+from option_store import resolve_option
 from datetime import datetime
 import json
 
@@ -17,39 +18,36 @@ async def book_accommodation(wrapper: RunContextWrapper[UserInfo], input: BookAc
     user_id = wrapper.context.user_id
     thread_id = wrapper.context.thread_id
 
-    session = SessionLocal()
-
-    # Check for duplicate booking first
-    existing_ref = get_context(user_id, thread_id, "last_booking_reference")
-    if existing_ref:
+    # Check for duplicate booking first, reserving the reference atomically
+    # so parallel tool calls can't both book
+    booking_reference = str(uuid.uuid4())[:8].upper()
+    if not compare_and_set(user_id, thread_id, "last_booking_reference", None, booking_reference):
+        existing_ref = get_context(user_id, thread_id, "last_booking_reference")
         logger.warning(f"Duplicate booking attempt. Returning existing reference: {existing_ref}")
         return BookAccommodationOutput(
             booking_reference=existing_ref,
             message=f"✅ Your accommodation has already been booked.\n✈️ Booking Reference: {existing_ref}\nPlease check your email for confirmation."
         )
 
-    # Get accommodation details - improved lookup
+    try:
+        return await _book_accommodation(user_id, thread_id, input, booking_reference)
+    except Exception:
+        # Release the reservation so the user can retry
+        compare_and_set(user_id, thread_id, "last_booking_reference", booking_reference, None)
+        raise
+
+
+async def _book_accommodation(user_id: str, thread_id: str, input: BookAccommodationInput, booking_reference: str) -> BookAccommodationOutput:
+    # Get accommodation details - prefer the stored search result, resolved
+    # by id, property token or display ordinal, over model-supplied details
     accommodation = None
-    if input.selected_accommodation_details:
+    acc = resolve_option(user_id, thread_id, "accommodation", input.selected_accommodation_id)
+    if acc:
+        accommodation = [acc]
+    elif input.selected_accommodation_details:
         accommodation = input.selected_accommodation_details
     else:
-        # Try to get all accommodation options from context
-        all_accommodations = get_context(user_id, thread_id, "accommodation_options") or []
-        
-        # Find the specific accommodation by ID
-        for acc in all_accommodations:
-            if isinstance(acc, str):
-                try:
-                    acc = json.loads(acc)
-                except json.JSONDecodeError:
-                    continue
-            
-            if isinstance(acc, dict) and acc.get('id') == input.selected_accommodation_id:
-                accommodation = [acc]
-                break
-        
-        if not accommodation:
-            raise ValueError("No accommodation data available to book. Cannot proceed.")
+        raise ValueError("No accommodation data available to book. Cannot proceed.")
 
     if not accommodation or len(accommodation) == 0:
         raise ValueError("No valid accommodation data found")
@@ -93,8 +91,6 @@ async def book_accommodation(wrapper: RunContextWrapper[UserInfo], input: BookAc
         else:
             total_price = acc_data.price_info.extracted_price
 
-    booking_reference = str(uuid.uuid4())[:8].upper()
-
     try:
         # Prepare common booking data
         booking_data = {
@@ -126,16 +122,18 @@ async def book_accommodation(wrapper: RunContextWrapper[UserInfo], input: BookAc
             'accommodation_location': json.dumps(acc_data.get('location', {})) if isinstance(acc_data, dict) else (json.dumps(acc_data.location.dict()) if hasattr(acc_data, 'location') and acc_data.location else None)
         }
 
-        booking = AccommodationBooking(**booking_data)
-        session.add(booking)
-        session.commit()
+        now = datetime.utcnow()
+        # Durable once this returns; the database commit happens in the background
+        await booking_queue.enqueue("accommodation", user_id, booking_reference, {
+            AccommodationBooking.__tablename__: [dict(booking_data, created_at=now, updated_at=now)],
+        })
 
-        # Store booking reference in context
-        set_context(user_id, thread_id, "last_booking_reference", booking_reference)
+        # Store booking details in context
         set_context(user_id, thread_id, "last_passenger_name", input.full_name)
         set_context(user_id, thread_id, "last_email", input.email)
         set_context(user_id, thread_id, "last_phone", input.phone)
-        set_context(user_id, thread_id, "last_accommodation_id", input.selected_accommodation_id)
+        # The resolved id, not the ref: an ordinal would point into whatever search comes next
+        set_context(user_id, thread_id, "last_accommodation_id", acc["id"] if acc else input.selected_accommodation_id)
         # In book_accommodation, after successful booking:
         set_context(user_id, thread_id, "has_booked_accommodation", True)
         set_context(user_id, thread_id, "accommodation_booking_time", datetime.now().isoformat())
@@ -157,8 +155,5 @@ async def book_accommodation(wrapper: RunContextWrapper[UserInfo], input: BookAc
         )
 
     except Exception as e:
-        session.rollback()
         logger.error(f"Error during accommodation booking: {e}")
-        raise
-    finally:
-        session.close()
\ No newline at end of file
+        raise
\ No newline at end of file
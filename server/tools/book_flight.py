@@ -1,11 +1,12 @@
-from db.session import SessionLocal
+import booking_queue
 from models.db_models import FlightBooking, FlightLegDB, LayoverDB, FlightSegmentDB
 from agents import function_tool, RunContextWrapper
 from models.context_models import UserInfo
 import uuid
 import logging
 from models.flight_models import BookFlightInput, BookFlightOutput, FlightOption
-from in_memory_context import set_context, get_context
+from in_memory_context import set_context, get_context, compare_and_set
+from option_store import resolve_option
 from datetime import datetime
 import json
 
@@ -19,34 +20,63 @@ async def book_flight(wrapper: RunContextWrapper[UserInfo], input: BookFlightInp
     user_id = wrapper.context.user_id
     thread_id = wrapper.context.thread_id
 
-    session = SessionLocal()
-
-    existing_ref = get_context(user_id, thread_id, "last_booking_reference")
-    if existing_ref:
+    # Reserve the reference atomically so parallel tool calls can't both book
+    booking_reference = str(uuid.uuid4())[:8].upper()
+    if not compare_and_set(user_id, thread_id, "last_booking_reference", None, booking_reference):
+        existing_ref = get_context(user_id, thread_id, "last_booking_reference")
         logger.warning(f"Duplicate booking attempt. Returning existing reference: {existing_ref}")
         return BookFlightOutput(
             booking_reference=existing_ref,
             message=f"✅ Your flight has already been booked.\n✈️ Booking Reference: {existing_ref}\nPlease check your email for confirmation."
         )
 
-    # Get all flight details (not just the first one)
-    if input.selected_flight_details:
+    try:
+        return await _book_flight(user_id, thread_id, input, booking_reference)
+    except Exception:
+        # Release the reservation so the user can retry
+        compare_and_set(user_id, thread_id, "last_booking_reference", booking_reference, None)
+        raise
+
+
+# Typed copies of the display strings; kept out of the itinerary snapshot
+_TIMESTAMP_COLUMNS = ("departure_at", "arrival_at")
+
+
+def _parse_flight_time(value):
+    """SerpAPI times ("2025-08-10 14:30") are airport-local with no zone; keep them as naive wall-clock times."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    # An explicit offset already names the local wall clock; the zone itself isn't stored
+    return parsed.replace(tzinfo=None)
+
+
+def _without_timestamps(row):
+    return {k: v for k, v in row.items() if k not in _TIMESTAMP_COLUMNS}
+
+
+async def _book_flight(user_id: str, thread_id: str, input: BookFlightInput, booking_reference: str) -> BookFlightOutput:
+    # Multi-city selections pass one option per leg; otherwise prefer the
+    # stored search result, resolved by id, token or display ordinal
+    flight_data = None
+    if not (input.selected_flight_details and len(input.selected_flight_details) > 1):
+        flight_data = resolve_option(user_id, thread_id, "flight", input.selected_flight_id)
+
+    if flight_data:
+        try:
+            flights = [FlightOption.model_validate(flight_data)]
+            is_multi_city = False
+        except Exception as e:
+            logger.error(f"Failed to parse flight data: {e}")
+            raise ValueError("Invalid flight data format")
+    elif input.selected_flight_details:
         flights = input.selected_flight_details
         is_multi_city = len(input.selected_flight_details) > 1
     else:
-        flight_data = get_context(user_id, thread_id, f"flight_option_{input.selected_flight_id}")
-        if flight_data:
-            try:
-                # Ensure flight_data is properly deserialized
-                if isinstance(flight_data, str):
-                    flight_data = json.loads(flight_data)
-                flights = [FlightOption(**flight_data)]
-                is_multi_city = False
-            except Exception as e:
-                logger.error(f"Failed to parse flight data: {e}")
-                raise ValueError("Invalid flight data format")
-        else:
-            raise ValueError("No flight data available to book. Cannot proceed.")
+        raise ValueError("No flight data available to book. Cannot proceed.")
 
     try:
         logger.info(f"Booking flight for user {user_id}. Flight details: {json.dumps([f.dict() for f in flights], default=str, indent=2)}")
@@ -70,8 +100,6 @@ async def book_flight(wrapper: RunContextWrapper[UserInfo], input: BookFlightInp
 
 
 
-    booking_reference = str(uuid.uuid4())[:8].upper()
-
     try:
         # Accumulate total price and collect all airlines across all flights
         total_price = 0.0
@@ -105,9 +133,11 @@ async def book_flight(wrapper: RunContextWrapper[UserInfo], input: BookFlightInp
             if hasattr(flight, 'price_breakdown') and flight.price_breakdown:
                 price_breakdown.extend([pb.dict() for pb in flight.price_breakdown])
 
-        # Create booking
-        booking = FlightBooking(
-            id=str(uuid.uuid4()),
+        # Build every row up front; the booking worker writes one multi-row
+        # INSERT per table in a single transaction
+        booking_id = str(uuid.uuid4())
+        booking_row = dict(
+            id=booking_id,
             user_id=user_id,
             thread_id=thread_id,
             booking_reference=booking_reference,
@@ -121,67 +151,75 @@ async def book_flight(wrapper: RunContextWrapper[UserInfo], input: BookFlightInp
             currency=flights[0].currency,  # Assuming same currency for all flights
             booking_token=flights[0].booking_token if hasattr(flights[0], 'booking_token') else None,
             is_multi_city=is_multi_city,
-            price_breakdown=price_breakdown or None
+            price_breakdown=price_breakdown or None,
+            created_at=datetime.utcnow()
         )
-        session.add(booking)
-        session.flush()
 
-        # Save all legs from all flights
+        leg_rows, segment_rows, layover_rows = [], [], []
+        snapshot_legs = []
         for flight in flights:
-            if hasattr(flight, 'legs') and flight.legs:
-                for leg in flight.legs:
-                    leg_id = str(uuid.uuid4())
-                    flight_leg = FlightLegDB(
-                        id=leg_id,
-                        booking_id=booking.id,
-                        departure_date_time=leg.departure_date_time,
-                        arrival_date_time=leg.arrival_date_time,
-                        origin=leg.origin,
-                        destination=leg.destination,
-                        total_duration=leg.total_duration,
-                        stops=leg.stops or 0
-                    )
-                    session.add(flight_leg)
-
-                    # Save all segments
-                    if leg.segments:
-                        for seg in leg.segments:
-                            segment = FlightSegmentDB(
-                                id=str(uuid.uuid4()),
-                                booking_id=booking.id,
-                                leg_id=leg_id,
-                                segment_number=seg.segment_number,
-                                departure_airport=seg.departure_airport,
-                                departure_datetime=seg.departure_datetime,
-                                arrival_airport=seg.arrival_airport,
-                                arrival_datetime=seg.arrival_datetime,
-                                airline=seg.airline,
-                                flight_number=seg.flight_number,
-                                duration=seg.duration,
-                                cabin_class=seg.cabin_class,
-                                extension_info=seg.extension_info if seg.extension_info else None
-                            )
-                            session.add(segment)
-
-                    # Save all layovers
-                    if leg.layovers:
-                        for lay in leg.layovers:
-                            layover = LayoverDB(
-                                id=str(uuid.uuid4()),
-                                booking_id=booking.id,
-                                leg_id=leg_id,
-                                layover_airport=lay.layover_airport,
-                                layover_duration=lay.layover_duration
-                            )
-                            session.add(layover)
-
-        session.commit()
-
-        set_context(user_id, thread_id, "last_booking_reference", booking_reference)
+            for leg in getattr(flight, 'legs', None) or []:
+                leg_id = str(uuid.uuid4())
+                leg_segment_start, leg_layover_start = len(segment_rows), len(layover_rows)
+                leg_rows.append(dict(
+                    id=leg_id,
+                    booking_id=booking_id,
+                    departure_date_time=leg.departure_date_time,
+                    arrival_date_time=leg.arrival_date_time,
+                    departure_at=_parse_flight_time(leg.departure_date_time),
+                    arrival_at=_parse_flight_time(leg.arrival_date_time),
+                    origin=leg.origin,
+                    destination=leg.destination,
+                    total_duration=leg.total_duration,
+                    stops=leg.stops or 0
+                ))
+                for seg in leg.segments or []:
+                    segment_rows.append(dict(
+                        id=str(uuid.uuid4()),
+                        booking_id=booking_id,
+                        leg_id=leg_id,
+                        segment_number=seg.segment_number,
+                        departure_airport=seg.departure_airport,
+                        departure_datetime=seg.departure_datetime,
+                        arrival_airport=seg.arrival_airport,
+                        arrival_datetime=seg.arrival_datetime,
+                        departure_at=_parse_flight_time(seg.departure_datetime),
+                        arrival_at=_parse_flight_time(seg.arrival_datetime),
+                        airline=seg.airline,
+                        flight_number=seg.flight_number,
+                        duration=seg.duration,
+                        cabin_class=seg.cabin_class,
+                        extension_info=seg.extension_info if seg.extension_info else None
+                    ))
+                for lay in leg.layovers or []:
+                    layover_rows.append(dict(
+                        id=str(uuid.uuid4()),
+                        booking_id=booking_id,
+                        leg_id=leg_id,
+                        layover_airport=lay.layover_airport,
+                        layover_duration=lay.layover_duration
+                    ))
+                snapshot_legs.append(dict(
+                    _without_timestamps(leg_rows[-1]),
+                    segments=[_without_timestamps(row) for row in segment_rows[leg_segment_start:]],
+                    layovers=layover_rows[leg_layover_start:],
+                ))
+        booking_row["itinerary_snapshot"] = {"legs": snapshot_legs}
+
+        # Durable once this returns; the database commit happens in the background
+        await booking_queue.enqueue("flight", user_id, booking_reference, {
+            FlightBooking.__tablename__: [booking_row],
+            FlightLegDB.__tablename__: leg_rows,
+            FlightSegmentDB.__tablename__: segment_rows,
+            LayoverDB.__tablename__: layover_rows,
+        })
+
         set_context(user_id, thread_id, "last_passenger_name", input.full_name)
         set_context(user_id, thread_id, "last_email", input.email)
         set_context(user_id, thread_id, "last_phone", input.phone)
-        set_context(user_id, thread_id, "last_flight_id", input.selected_flight_id)
+        # The resolved id, not the ref: an ordinal would point into whatever search comes next
+        set_context(user_id, thread_id, "last_flight_id", flight_data["id"] if flight_data else input.selected_flight_id)
+        set_context(user_id, thread_id, "last_flight_booking_id", booking_id)
         # In book_flight, after successful booking:
         set_context(user_id, thread_id, "has_booked_flight", True)
         set_context(user_id, thread_id, "flight_booking_time", datetime.now().isoformat())
@@ -200,8 +238,5 @@ async def book_flight(wrapper: RunContextWrapper[UserInfo], input: BookFlightInp
         )
 
     except Exception as e:
-        session.rollback()
         logger.error(f"Error during booking: {e}")
-        raise
-    finally:
-        session.close()
\ No newline at end of file
+        raise
\ No newline at end of file
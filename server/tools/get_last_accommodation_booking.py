@@ -1,8 +1,11 @@
-from db.session import SessionLocal
+from db.session import AsyncSessionLocal
+from sqlalchemy import select
 from models.db_models import AccommodationBooking
 from agents import function_tool, RunContextWrapper
 from models.context_models import UserInfo
 from in_memory_context import get_context
+import booking_cache
+import booking_queue
 from datetime import datetime
 import json
 import logging
@@ -21,24 +24,46 @@ async def get_last_accommodation_booking(wrapper: RunContextWrapper[UserInfo]) -
 
     if not user_id:
         return "User ID is required to retrieve booking details."
-    # First try to get from context
-    
-    
-    session = SessionLocal()
+
+    if booking_queue.has_pending("accommodation", user_id):
+        # Answered from the queue until the worker commits it; not cached meanwhile
+        result = await _retrieve_last_booking(user_id)
+        return result if result is not None else {"message": "An error occurred while retrieving your booking details."}
+
+    hit, cached, version = booking_cache.get("accommodation", user_id)
+    if hit:
+        return cached
+    result = await _retrieve_last_booking(user_id)
+    if result is not None:
+        booking_cache.put("accommodation", user_id, result, version)
+        return result
+    return {"message": "An error occurred while retrieving your booking details."}
+
+
+async def _retrieve_last_booking(user_id: str):
+    """The rendered booking answer, or None if the lookup failed."""
+    session = AsyncSessionLocal()
     try:
-        # Get the booking from database
-        booking = session.query(AccommodationBooking).filter(
-            AccommodationBooking.user_id == user_id,
-         
-        
-        ).order_by(AccommodationBooking.created_at.desc()).first()
+        # A booking still in the write queue is newer than anything in the database
+        pending = booking_queue.pending_rows("accommodation", user_id, AccommodationBooking.__tablename__)
+        if pending:
+            booking = {column.name: pending[-1].get(column.name) for column in AccommodationBooking.__table__.columns}
+        else:
+            # Get the booking from database
+            result = await session.execute(
+                select(AccommodationBooking)
+                .where(AccommodationBooking.user_id == user_id)
+                .order_by(AccommodationBooking.created_at.desc(), AccommodationBooking.id.desc())
+                .limit(1)
+            )
+            booking = result.scalars().first()
         
         if not booking:
             return {"message": "No accommodation booking found with the provided reference."}
         
         # Convert booking to dict if it's an object
         if not isinstance(booking, dict):
-            booking = booking.__dict__
+            booking = {column.name: getattr(booking, column.name) for column in AccommodationBooking.__table__.columns}
         
         # Format the booking details similar to search results
         message_lines = []
@@ -69,7 +94,10 @@ async def get_last_accommodation_booking(wrapper: RunContextWrapper[UserInfo]) -
             message_lines.append("<ul>")
             message_lines.append(f"<li>Adults: {price_breakdown['adults']['count']} x ${price_breakdown['base_rate_per_person']:.2f} = ${price_breakdown['adults']['total']:.2f} per night</li>")
             if price_breakdown.get('children'):
-                message_lines.append(f"<li>Children: {price_breakdown['children']['count']} x ${price_breakdown['base_rate_per_person'] * 0.75:.2f} = ${price_breakdown['children']['total']:.2f} per night</li>")
+                child_rate = price_breakdown['children']['total'] / price_breakdown['children']['count']
+                message_lines.append(f"<li>Children: {price_breakdown['children']['count']} x ${child_rate:.2f} = ${price_breakdown['children']['total']:.2f} per night</li>")
+            if price_breakdown.get('taxes'):
+                message_lines.append(f"<li>Taxes: ${price_breakdown['taxes']:.2f} per night</li>")
             message_lines.append("</ul>")
         
         # Accommodation details
@@ -116,6 +144,6 @@ async def get_last_accommodation_booking(wrapper: RunContextWrapper[UserInfo]) -
         
     except Exception as e:
         logger.error(f"Error retrieving booking details: {e}")
-        return {"message": "An error occurred while retrieving your booking details."}
+        return None
     finally:
-        session.close()
\ No newline at end of file
+        await session.close()
\ No newline at end of file
@@ -0,0 +1,46 @@
+# get_option_details.py
+#
+# Full details of one option from the latest flight or accommodation search in
+# this thread. Search outputs over budget reach the model as a digest (see
+# output_guard.py); this is how it gets the rest.
+
+import json
+import logging
+
+from agents import function_tool, RunContextWrapper
+
+from models.context_models import UserInfo
+from option_store import get_option_set
+
+logger = logging.getLogger("chat_logger")
+
+# Fields the model never needs: images are shown by the frontend from the search output
+_DROP_FIELDS = ("formatted_images", "images", "booking_token")
+
+
+@function_tool
+def get_option_details(wrapper: RunContextWrapper[UserInfo], kind: str, option: str) -> str:
+    """Full details of one search result.
+
+    Args:
+        kind: "flight" or "accommodation".
+        option: The option number shown to the user (e.g. "3"), or the option id.
+    """
+    user_id = wrapper.context.user_id
+    thread_id = wrapper.context.thread_id
+    kind = kind.strip().lower()
+    if kind not in ("flight", "accommodation"):
+        return 'kind must be "flight" or "accommodation".'
+
+    option_set = get_option_set(user_id, thread_id, kind)
+    if option_set is None:
+        return f"No {kind} search results in this conversation (they expire after an hour); search again."
+    found = option_set.resolve(option)
+    if found is None:
+        return f"No {kind} option '{option}'; there are {len(option_set)} options, numbered 1 to {len(option_set)}."
+
+    logger.info(f"Option details for user {user_id}: {kind} {option}")
+    if kind == "flight" and found.get("formatted_summary"):
+        return f"id: {found['id']}\n{found['formatted_summary']}"
+    details = {k: v for k, v in found.items() if k not in _DROP_FIELDS and v not in (None, [], {})}
+    return json.dumps(details, separators=(",", ":"), default=str)
@@ -0,0 +1,158 @@
+# tools/output_guard.py
+#
+# Every tool output goes back to the model whole, on this and every later call
+# of the run. A size guard at the tool boundary: outputs over a per-tool token
+# budget are replaced by a structured digest (the top options with their key
+# fields and ids) and the model is told to call get_option_details for more.
+# The full options stay in the option store, so nothing is lost.
+
+import json
+import logging
+import os
+from collections import defaultdict
+
+from pydantic import BaseModel
+
+from token_count import count_tokens
+
+logger = logging.getLogger("chat_logger")
+
+TOOL_OUTPUT_MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "2000"))
+DIGEST_TOP_K = int(os.getenv("TOOL_OUTPUT_DIGEST_TOP_K", "5"))
+
+_stats = defaultdict(lambda: {"calls": 0, "truncated": 0, "tokens_in": 0, "tokens_out": 0})
+
+
+def _as_dict(output):
+    if isinstance(output, BaseModel):
+        return output.model_dump(mode="json")
+    return output if isinstance(output, dict) else None
+
+
+def _flight_item(ordinal, option):
+    return {
+        "option": ordinal,
+        "id": option.get("id"),
+        "airline": option.get("airline"),
+        "total_price": option.get("total_price"),
+        "currency": option.get("currency"),
+        "legs": [
+            {
+                "from": leg.get("origin"),
+                "to": leg.get("destination"),
+                "departs": leg.get("departure_date_time"),
+                "arrives": leg.get("arrival_date_time"),
+                "stops": leg.get("stops"),
+                "duration": leg.get("total_duration"),
+            }
+            for leg in option.get("legs") or []
+        ],
+    }
+
+
+def _accommodation_item(ordinal, option):
+    return {
+        "option": ordinal,
+        "id": option.get("id"),
+        "name": option.get("name"),
+        "type": option.get("type"),
+        "price_per_night": (option.get("price_info") or {}).get("price"),
+        "total_price": (option.get("price_breakdown") or {}).get("total_price"),
+        "rating": option.get("rating"),
+        "reviews": option.get("reviews"),
+        "hotel_class": option.get("hotel_class"),
+        "free_cancellation": option.get("free_cancellation"),
+        "amenities": (option.get("amenities") or [])[:5],
+    }
+
+
+_FLIGHTS = ("flights", "flight", _flight_item)
+_ACCOMMODATION = ("accommodation", "accommodation", _accommodation_item)
+
+# tool name -> [(field holding the options, option kind in the option store, item digest)]
+DIGESTS = {
+    "search_flight": [_FLIGHTS],
+    "search_accommodation": [_ACCOMMODATION],
+    "plan_trip": [_FLIGHTS, _ACCOMMODATION],
+}
+
+
+def _digest(tool_name, payload, top_k):
+    digest = {"truncated": True}
+    for field, kind, item in DIGESTS[tool_name]:
+        options = payload.get(field) or []
+        digest[f"total_{field}_options"] = len(options)
+        digest[field] = [
+            {k: v for k, v in item(ordinal, option).items() if v is not None}
+            for ordinal, option in enumerate(options[:top_k], 1)
+        ]
+    kinds = " or ".join(f"'{kind}'" for _, kind, _ in DIGESTS[tool_name])
+    digest["note"] = (
+        f"Output shortened to fit the context budget. Present these options to the user; "
+        f"call get_option_details(kind={kinds}, option=<option number or id>) for full details "
+        f"of any option, including ones not shown."
+    )
+    return json.dumps(digest, separators=(",", ":"), default=str)
+
+
+def _clip(text, max_tokens):
+    # chars/4 is generous enough that the clipped text lands near the budget
+    cut = text[: max_tokens * 4]
+    return f"{cut}\n[... output truncated: {len(text) - len(cut)} more characters not shown]"
+
+
+def shrink_output(tool_name, output, max_tokens=TOOL_OUTPUT_MAX_TOKENS):
+    """`output` if it fits in `max_tokens`, else a digest (or a clipped string) that does."""
+    text = output if isinstance(output, str) else str(output)
+    tokens = count_tokens(text)
+    stats = _stats[tool_name]
+    stats["calls"] += 1
+    stats["tokens_in"] += tokens
+    if tokens <= max_tokens:
+        stats["tokens_out"] += tokens
+        return output
+
+    payload = _as_dict(output)
+    if tool_name in DIGESTS and payload is not None:
+        top_k = DIGEST_TOP_K
+        shrunk = _digest(tool_name, payload, top_k)
+        while top_k > 1 and count_tokens(shrunk) > max_tokens:
+            top_k -= 1
+            shrunk = _digest(tool_name, payload, top_k)
+    else:
+        shrunk = _clip(text, max_tokens)
+
+    shrunk_tokens = count_tokens(shrunk)
+    stats["truncated"] += 1
+    stats["tokens_out"] += shrunk_tokens
+    logger.warning(
+        f"Tool output from {tool_name} over budget: {tokens} > {max_tokens} tokens, "
+        f"sent {shrunk_tokens} ({stats['truncated']}/{stats['calls']} calls truncated)"
+    )
+    return shrunk
+
+
+def guard_output(tool, max_tokens: int = None):
+    """Apply shrink_output to everything `tool` (a FunctionTool) returns. Idempotent."""
+    if getattr(tool, "_output_guarded", False):
+        return tool
+    budget = max_tokens or TOOL_OUTPUT_MAX_TOKENS
+    invoke = tool.on_invoke_tool
+
+    async def on_invoke_tool(ctx, input):
+        return shrink_output(tool.name, await invoke(ctx, input), budget)
+
+    tool.on_invoke_tool = on_invoke_tool
+    tool._output_guarded = True
+    return tool
+
+
+def guard_stats():
+    """Per-tool call, truncation and token counters."""
+    return {
+        "budget_tokens": TOOL_OUTPUT_MAX_TOKENS,
+        "tools": {
+            name: dict(stats, truncation_rate=round(stats["truncated"] / stats["calls"], 3) if stats["calls"] else 0)
+            for name, stats in _stats.items()
+        },
+    }
@@ -1,6 +1,128 @@
-from datetime import datetime
-import dateparser
-from agents import Agent, Runner,function_tool
+# parse_natural_date.py
+#
+# Date phrases from chat ("12 Aug", "next Friday", "tomorrow") to YYYY-MM-DD.
+# The forms users actually type are handled by precompiled patterns; only
+# anything else goes to dateparser, which is slow to import and to call and is
+# loaded on first use. Results are memoized per (text, today).
+
+import calendar
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List
+
+from agents import function_tool
+
+_MONTHS = {}
+for _number in range(1, 13):
+    _MONTHS[calendar.month_name[_number].lower()] = _number
+    _MONTHS[calendar.month_abbr[_number].lower()] = _number
+_MONTHS["sept"] = 9
+_WEEKDAYS = {calendar.day_name[i].lower(): i for i in range(7)}
+_WEEKDAYS.update({calendar.day_abbr[i].lower(): i for i in range(7)})
+
+_MONTH = "(?P<month>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+_DAY = r"(?P<day>\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r"(?:,?\s+(?P<year>\d{4}))?"
+
+_ISO_RE = re.compile(r"^(?P<year>\d{4})[-/.](?P<month>\d{1,2})[-/.](?P<day>\d{1,2})$")
+_DAY_MONTH_RE = re.compile(rf"^(?:the\s+)?{_DAY}(?:\s+of)?\s+{_MONTH}{_YEAR}$")
+_MONTH_DAY_RE = re.compile(rf"^{_MONTH}\s+(?:the\s+)?{_DAY}{_YEAR}$")
+_WEEKDAY_RE = re.compile(
+    r"^(?:on\s+)?(?P<which>this|next|coming|this\s+coming)?\s*(?P<weekday>"
+    + "|".join(sorted(_WEEKDAYS, key=len, reverse=True))
+    + r")\.?$"
+)
+_RELATIVE_RE = re.compile(r"^in\s+(?P<count>\d+|a|an|one|two|three|four|five|six|seven)\s+(?P<unit>day|week)s?$")
+_NAMED_DAYS = {"today": 0, "tonight": 0, "tomorrow": 1, "tmrw": 1, "day after tomorrow": 2, "the day after tomorrow": 2}
+_COUNT_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7}
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower().rstrip("."))
+
+
+def _day_in_year(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _future_day(month, day, year, today):
+    """An explicit year as given; otherwise the next occurrence from today (29 Feb may be years out)."""
+    if year:
+        return _day_in_year(int(year), month, day)
+    for candidate in range(today.year, today.year + 5):
+        parsed = _day_in_year(candidate, month, day)
+        if parsed is not None and parsed >= today:
+            return parsed
+    return None
+
+
+def _valid(parsed, text):
+    # The pattern matched, so dateparser won't do better with e.g. "31 Feb"
+    if parsed is None:
+        raise ValueError(f"'{text}' is not a valid calendar date.")
+    return parsed
+
+
+def _fast_path(text: str, today: date):
+    if text in _NAMED_DAYS:
+        return today + timedelta(days=_NAMED_DAYS[text])
+
+    match = _ISO_RE.match(text)
+    if match:
+        return _valid(_day_in_year(int(match["year"]), int(match["month"]), int(match["day"])), text)
+
+    match = _DAY_MONTH_RE.match(text) or _MONTH_DAY_RE.match(text)
+    if match:
+        return _valid(_future_day(_MONTHS[match["month"]], int(match["day"]), match["year"], today), text)
+
+    match = _WEEKDAY_RE.match(text)
+    if match:
+        # "Friday", "this Friday" and "next Friday" all mean the coming one, as dateparser reads them
+        ahead = (_WEEKDAYS[match["weekday"]] - today.weekday()) % 7 or 7
+        if ahead == 7 and match["which"] in ("this", "this coming"):
+            ahead = 0
+        return today + timedelta(days=ahead)
+
+    match = _RELATIVE_RE.match(text)
+    if match:
+        count = match["count"]
+        count = int(count) if count.isdigit() else _COUNT_WORDS[count]
+        return today + timedelta(days=count * (7 if match["unit"] == "week" else 1))
+    return None
+
+
+def _dateparser_fallback(text: str, today: date):
+    import dateparser  # heavy; only needed for phrasings the fast paths don't cover
+
+    base = datetime.combine(today, datetime.min.time())
+    parsed = dateparser.parse(text, settings={"PREFER_DATES_FROM": "future", "RELATIVE_BASE": base})
+    if not parsed:
+        return None
+    parsed = parsed.date()
+    # A past date without an explicit year is meant for next year
+    if parsed < today and not re.search(r"\b\d{4}\b", text):
+        parsed = _day_in_year(parsed.year + 1, parsed.month, parsed.day) or parsed
+    return parsed
+
+
+@lru_cache(maxsize=2048)
+def _resolve(text: str, today: date) -> date:
+    parsed = _fast_path(text, today) or _dateparser_fallback(text, today)
+    if parsed is None:
+        raise ValueError(f"Could not parse the date from '{text}'.")
+    if parsed < today:
+        raise ValueError(f"The date '{text}' is in the past.")
+    return parsed
+
+
+def resolve_date(text: str, today: date = None) -> str:
+    """`text` as YYYY-MM-DD; raises ValueError if it can't be parsed or is in the past."""
+    return _resolve(_normalize(text), today or date.today()).strftime("%Y-%m-%d")
+
 
 @function_tool
 def parse_natural_date(text: str) -> str:
@@ -8,24 +130,21 @@ def parse_natural_date(text: str) -> str:
     Parses natural language date expressions and returns YYYY-MM-DD format.
     If the date is ambiguous and has passed this year, it assumes next year.
     """
+    return resolve_date(text)
 
-    now = datetime.now()
-    parsed_date = dateparser.parse(text, settings={"PREFER_DATES_FROM": "future"})
-
-    if not parsed_date:
-        raise ValueError(f"Could not parse the date from '{text}'.")
-
-    # Round to date only
-    parsed_date = parsed_date.replace(hour=0, minute=0, second=0, microsecond=0)
 
-    # If it's in the past and looks like it's meant to be future, push to next year
-    if parsed_date.date() < now.date():
-        # Re-parse with an assumption of next year if not explicit
-        parsed_date = dateparser.parse(
-            f"{text} {now.year + 1}",
-            settings={"PREFER_DATES_FROM": "future"}
-        )
-        if not parsed_date or parsed_date.date() < now.date():
-            raise ValueError(f"The date '{text}' is in the past.")
-
-    return parsed_date.strftime('%Y-%m-%d')
+@function_tool
+def parse_natural_dates(texts: List[str]) -> Dict[str, str]:
+    """
+    Parses several natural language date expressions in one call (e.g. the departure and
+    return dates, or every leg of a multi-city trip). Returns each expression mapped to
+    YYYY-MM-DD, or to an error message if it could not be resolved.
+    """
+    today = date.today()
+    results = {}
+    for text in texts:
+        try:
+            results[text] = resolve_date(text, today)
+        except ValueError as e:
+            results[text] = f"error: {e}"
+    return results
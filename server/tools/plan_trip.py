@@ -0,0 +1,137 @@
+# plan_trip.py
+#
+# Flight and accommodation search in one tool call. The two upstream searches
+# run concurrently, with the stay dates taken from the flight dates, so the
+# common "flight + hotel" request costs one model turn and one round of
+# network latency instead of a search, a handoff and a second search.
+# Results go to the option store like the individual searches, so the flight
+# and accommodation agents can book from them.
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Union
+
+from agents import function_tool, RunContextWrapper
+
+from models.accommodation_models import SearchAccommodationInput
+from models.context_models import UserInfo
+from models.flight_models import SearchFlightInput
+from models.trip_models import PlanTripInput, PlanTripOutput
+from tools.search_accommodation import calculate_nights, find_accommodation, format_accommodation_message
+from tools.search_flight import find_flights
+
+logger = logging.getLogger("chat_logger")
+
+
+def stay_dates(input: PlanTripInput):
+    """Check-in on the outbound date, check-out on the return date (or after `nights`)."""
+    if input.return_date:
+        return input.departure_date, input.return_date
+    check_in = datetime.strptime(input.departure_date, "%Y-%m-%d")
+    return input.departure_date, (check_in + timedelta(days=input.nights)).strftime("%Y-%m-%d")
+
+
+def _flight_search(input: PlanTripInput) -> SearchFlightInput:
+    return SearchFlightInput(
+        origin=input.origin,
+        destination=input.destination,
+        departure_date=input.departure_date,
+        return_date=input.return_date,
+        cabin_class=input.cabin_class,
+        adults=input.adults,
+        children=input.children,
+        infants=input.infants,
+        max_price=input.max_flight_price,
+    )
+
+
+def _accommodation_search(input: PlanTripInput, check_in, check_out) -> SearchAccommodationInput:
+    return SearchAccommodationInput(
+        location=input.destination_city or input.destination,
+        check_in_date=check_in,
+        check_out_date=check_out,
+        adults=input.adults,
+        children=input.children,
+        children_ages=input.children_ages,
+        max_price=input.max_price_per_night,
+    )
+
+
+def _summary(input, flights, accommodation, check_in, check_out, errors):
+    nights = calculate_nights(check_in, check_out)
+    parts = [f"<h3>✈️ Flights {input.origin} → {input.destination}</h3>"]
+    if flights:
+        parts.extend(f"<pre>{option.formatted_summary}</pre>" for option in flights if option.formatted_summary)
+        arrival = flights[0].legs[0].arrival_date_time[:10] if flights[0].legs else None
+        if arrival and arrival > check_in:
+            parts.append(f"<p>Note: the outbound flight lands on {arrival}; the stay below starts on {check_in}.</p>")
+    else:
+        parts.append("<p>No flights found.</p>")
+
+    parts.append(f"<h3>🏨 Stays in {input.destination_city or input.destination}, {check_in} to {check_out}</h3>")
+    if accommodation:
+        parts.append(format_accommodation_message(
+            [option.model_dump() for option in accommodation], check_in, check_out, input.adults, input.children
+        ))
+    else:
+        parts.append("<p>No accommodation found.</p>")
+
+    if flights and accommodation:
+        flight_index, flight = min(enumerate(flights, 1), key=lambda pair: pair[1].total_price)
+        stay_index, stay = min(
+            enumerate(accommodation, 1), key=lambda pair: pair[1].price_breakdown.total_price
+        )
+        stay_total = stay.price_breakdown.total_price * max(nights, 1)
+        parts.append(
+            f"<p><strong>Cheapest combination:</strong> flight option {flight_index} "
+            f"({flight.total_price:.2f} {flight.currency}) + stay option {stay_index} "
+            f"({stay_total:.2f} USD for {nights} nights) = {flight.total_price + stay_total:.2f} USD</p>"
+        )
+    parts.extend(f"<p>⚠️ {error}</p>" for error in errors)
+    return "\n".join(parts)
+
+
+async def plan_trip_search(user_id, thread_id, input: PlanTripInput) -> PlanTripOutput:
+    check_in, check_out = stay_dates(input)
+    flight_result, accommodation_result = await asyncio.gather(
+        asyncio.to_thread(find_flights, user_id, thread_id, _flight_search(input)),
+        asyncio.to_thread(find_accommodation, user_id, thread_id, _accommodation_search(input, check_in, check_out)),
+        return_exceptions=True,
+    )
+
+    # One search failing still leaves the other worth showing
+    errors = []
+    flights = accommodation = []
+    if isinstance(flight_result, Exception):
+        logger.error(f"plan_trip flight search failed: {flight_result}")
+        errors.append(f"Flight search failed: {flight_result}")
+    else:
+        flights = flight_result.flights
+    if isinstance(accommodation_result, Exception):
+        logger.error(f"plan_trip accommodation search failed: {accommodation_result}")
+        errors.append(f"Accommodation search failed: {accommodation_result}")
+    else:
+        accommodation = accommodation_result.accommodation
+
+    return PlanTripOutput(
+        flights=flights,
+        accommodation=accommodation,
+        check_in_date=check_in,
+        check_out_date=check_out,
+        formatted_summary=_summary(input, flights, accommodation, check_in, check_out, errors),
+        errors=errors,
+    )
+
+
+@function_tool
+async def plan_trip(wrapper: RunContextWrapper[UserInfo], input: PlanTripInput) -> Union[PlanTripOutput, str]:
+    """Search flights and accommodation at the destination together, in one call, for trips where the
+    user wants both. The stay runs from the departure date to the return date (or for `nights`).
+    Show `formatted_summary` as is; options can then be booked by their number."""
+    if not input.return_date and not input.nights:
+        return "Ask the user for a return date or how many nights they will stay, then call plan_trip again."
+    user_id = wrapper.context.user_id
+    thread_id = wrapper.context.thread_id
+    logger.info(f"Planning trip for user {user_id}: {input.model_dump()}")
+    return await plan_trip_search(user_id, thread_id, input)
@@ -30,6 +30,8 @@ def format_price_output(data: dict) -> str:
         dates = flight_details.get('dates', 'Unknown')
         
         flight_info += f"\n   • {airline} ({flight_numbers})\n   • {origin} → {destination}\n   • {dates}"
+        if flight_details.get('travelers'):
+            flight_info += f"\n   • {flight_details['travelers']} traveller(s), {currency}{flight_details['per_traveler']:,.2f} each on average"
     
     # Build accommodation info section
     accommodation_info = f"🏨 ACCOMMODATION: {currency}{formatted_accommodation}"
@@ -41,6 +43,8 @@ def format_price_output(data: dict) -> str:
         nights = accommodation_details.get('nights', 'Unknown')
         
         accommodation_info += f"\n   • {hotel_name}\n   • {room_type}\n   • {check_in} to {check_out} ({nights} nights)"
+        if accommodation_details.get('per_night'):
+            accommodation_info += f"\n   • {currency}{accommodation_details['per_night']:,.2f} per night"
     
     return f"""
 ✨ TOTAL TRIP COST BREAKDOWN ✨
@@ -5,7 +5,54 @@ from models.flight_models import LastBookingOutput, RetrieveLastFlightBookingInp
 from models.context_models import UserInfo
 from db.session import SessionLocal
 from models.db_models import FlightBooking, FlightLegDB
-from sqlalchemy.orm import joinedload
+from in_memory_context import get_context
+import booking_cache
+import booking_queue
+from sqlalchemy.orm import selectinload
+
+
+def _load_itinerary(db, booking):
+    """Legs as plain dicts: from the booking's snapshot, or from the relations for older rows."""
+    if booking.itinerary_snapshot:
+        return booking.itinerary_snapshot.get("legs", [])
+
+    # One query per collection instead of a legs x segments x layovers join
+    legs = (
+        db.query(FlightLegDB)
+        .filter(FlightLegDB.booking_id == booking.id)
+        .options(selectinload(FlightLegDB.segments), selectinload(FlightLegDB.layovers))
+        .all()
+    )
+    return [
+        {
+            "origin": leg.origin,
+            "destination": leg.destination,
+            "departure_date_time": leg.departure_date_time,
+            "arrival_date_time": leg.arrival_date_time,
+            "total_duration": leg.total_duration,
+            "stops": leg.stops,
+            "segments": [
+                {
+                    "segment_number": seg.segment_number,
+                    "airline": seg.airline,
+                    "flight_number": seg.flight_number,
+                    "departure_airport": seg.departure_airport,
+                    "departure_datetime": seg.departure_datetime,
+                    "arrival_airport": seg.arrival_airport,
+                    "arrival_datetime": seg.arrival_datetime,
+                    "duration": seg.duration,
+                    "cabin_class": seg.cabin_class,
+                    "extension_info": seg.extension_info,
+                }
+                for seg in sorted(leg.segments, key=lambda seg: seg.segment_number)
+            ],
+            "layovers": [
+                {"layover_airport": lay.layover_airport, "layover_duration": lay.layover_duration}
+                for lay in leg.layovers
+            ],
+        }
+        for leg in legs
+    ]
 
 
 
@@ -21,21 +68,48 @@ def retrieve_last_booking_flight_details(
     if not user_id:
         return LastBookingOutput(message="User ID is required to retrieve booking details.")
 
+    thread_id = wrapper.context.thread_id
+    if booking_queue.has_pending("flight", user_id):
+        # Answered from the queue until the worker commits it; not cached meanwhile
+        return _retrieve_last_booking(user_id, thread_id)
+    # The lookup prefers this thread's booking, so each thread gets its own entry
+    hit, cached, version = booking_cache.get("flight", user_id, scope=thread_id)
+    if hit:
+        return cached
+    result = _retrieve_last_booking(user_id, thread_id)
+    booking_cache.put("flight", user_id, result, version, scope=thread_id)
+    return result
+
+
+def _pending_booking(user_id: str, booking_id: str = None):
+    """A queued booking not yet in the database, as an unsaved FlightBooking: `booking_id`, or the latest."""
+    rows = booking_queue.pending_rows("flight", user_id, FlightBooking.__tablename__)
+    if booking_id:
+        rows = [row for row in rows if row["id"] == booking_id]
+    return FlightBooking(**rows[-1]) if rows else None
+
+
+def _retrieve_last_booking(user_id: str, thread_id: str) -> LastBookingOutput:
     db = SessionLocal()
     try:
-        # Query with all relationships loaded
-        booking = (
-            db.query(FlightBooking)
-            .filter(FlightBooking.user_id == user_id)
-            .order_by(FlightBooking.created_at.desc())
-            .options(
-                joinedload(FlightBooking.legs)
-                .joinedload(FlightLegDB.segments),
-                joinedload(FlightBooking.legs)
-                .joinedload(FlightLegDB.layovers),
+        # The booking made in this thread is a primary-key read; otherwise
+        # take the user's latest via the (user_id, created_at) index. Bookings
+        # still in the write queue are newer than anything in the database.
+        booking = None
+        booking_id = get_context(user_id, thread_id, "last_flight_booking_id")
+        if booking_id:
+            booking = _pending_booking(user_id, booking_id) or db.get(FlightBooking, booking_id)
+            if booking and booking.user_id != user_id:
+                booking = None
+        if booking is None:
+            booking = _pending_booking(user_id)
+        if booking is None:
+            booking = (
+                db.query(FlightBooking)
+                .filter(FlightBooking.user_id == user_id)
+                .order_by(FlightBooking.created_at.desc(), FlightBooking.id.desc())
+                .first()
             )
-            .first()
-        )
 
         if not booking:
             return LastBookingOutput(message="I couldn't find any recent flight bookings for you.")
@@ -57,42 +131,42 @@ def retrieve_last_booking_flight_details(
             message_parts.append("\n### ✈️ Multi-City Itinerary")
 
         # Process each leg
-        for idx, leg in enumerate(booking.legs):
+        for idx, leg in enumerate(_load_itinerary(db, booking)):
             leg_label = f"### 🛫 {'Leg' if booking.is_multi_city else 'Flight'} {idx + 1}"
             message_parts.extend([
                 f"\n{leg_label}",
-                f"- **From:** {leg.origin} → **To:** {leg.destination}",
-                f"- **Departure:** {leg.departure_date_time}",
-                f"- **Arrival:** {leg.arrival_date_time}",
+                f"- **From:** {leg['origin']} → **To:** {leg['destination']}",
+                f"- **Departure:** {leg['departure_date_time']}",
+                f"- **Arrival:** {leg['arrival_date_time']}",
             ])
             
-            if leg.total_duration:
-                message_parts.append(f"- **Duration:** {leg.total_duration}")
-            if leg.stops is not None:
-                message_parts.append(f"- **Stops:** {leg.stops}")
+            if leg.get('total_duration'):
+                message_parts.append(f"- **Duration:** {leg['total_duration']}")
+            if leg.get('stops') is not None:
+                message_parts.append(f"- **Stops:** {leg['stops']}")
 
             # Flight segments
-            if leg.segments:
+            if leg.get('segments'):
                 message_parts.append("\n#### 🧩 Flight Segments")
-                for segment in leg.segments:
+                for segment in leg['segments']:
                     segment_parts = [
-                        f"- **Segment {segment.segment_number}**",
-                        f"  - **Airline:** {', '.join(segment.airline) if segment.airline else 'N/A'}",
-                        f"  - **Flight Number:** {segment.flight_number or 'N/A'}",
-                        f"  - **From:** {segment.departure_airport} at {segment.departure_datetime}",
-                        f"  - **To:** {segment.arrival_airport} at {segment.arrival_datetime}",
-                        f"  - **Duration:** {segment.duration}",
-                        f"  - **Cabin Class:** {segment.cabin_class}",
+                        f"- **Segment {segment['segment_number']}**",
+                        f"  - **Airline:** {', '.join(segment['airline']) if segment['airline'] else 'N/A'}",
+                        f"  - **Flight Number:** {segment['flight_number'] or 'N/A'}",
+                        f"  - **From:** {segment['departure_airport']} at {segment['departure_datetime']}",
+                        f"  - **To:** {segment['arrival_airport']} at {segment['arrival_datetime']}",
+                        f"  - **Duration:** {segment['duration']}",
+                        f"  - **Cabin Class:** {segment['cabin_class']}",
                     ]
-                    if segment.extension_info:
-                        segment_parts.append(f"  - **Extra Info:** {segment.extension_info}")
+                    if segment.get('extension_info'):
+                        segment_parts.append(f"  - **Extra Info:** {segment['extension_info']}")
                     message_parts.extend(segment_parts)
 
             # Layovers
-            if leg.layovers:
+            if leg.get('layovers'):
                 message_parts.append("\n#### ⏸️ Layovers")
-                for layover in leg.layovers:
-                    message_parts.append(f"- At **{layover.layover_airport}** for **{layover.layover_duration}**")
+                for layover in leg['layovers']:
+                    message_parts.append(f"- At **{layover['layover_airport']}** for **{layover['layover_duration']}**")
 
         # Booking link
         if booking.booking_token:
@@ -3,18 +3,22 @@ import requests
 import logging
 import uuid
 from typing import Optional
-from in_memory_context import set_context
-from agents import function_tool
+from option_store import store_options
+from agents import function_tool, RunContextWrapper
+from models.context_models import UserInfo
 from datetime import datetime
 from dotenv import load_dotenv
 import json
 from typing import List
 from models.accommodation_models import SearchAccommodationInput, SearchAccommodationOutput
+from fare_rules import price_stay_rates
 
 load_dotenv()
 
 logger = logging.getLogger("chat_logger")
 SERP_API_KEY = os.getenv("SERP_API_KEY")
+# Point at a local stub (see serpapi_stub.py) to run without network access
+SERP_API_URL = os.getenv("SERP_API_URL", "https://serpapi.com/search.json")
 
 
 def calculate_nights(check_in_date, check_out_date):
@@ -42,27 +46,25 @@ def format_accommodation_message(accommodations, check_in_date, check_out_date,
         # Calculate prices based on adults and children
         base_price = acc['price_info'].get('extracted_price', 0)
         
-        if 'price_breakdown' in acc:
-            # Use price breakdown if available
-            price_breakdown = acc['price_breakdown']
-            total_adults = price_breakdown['adults']['total'] * nights
-            total_children = price_breakdown['children']['total'] * nights if price_breakdown['children'] else 0
-            total_price = total_adults + total_children
-        else:
-            # Calculate manually if no breakdown
-            total_adults = base_price * adults * nights
-            total_children = base_price * 0.75 * children * nights if children else 0
-            total_price = total_adults + total_children
-        
+        price_breakdown = acc.get('price_breakdown')
+        if not price_breakdown:
+            # Price it now if the option came without a breakdown
+            priced = price_stay_rates([base_price], adults, children)[0]
+            price_breakdown = priced.model_dump() if priced else None
+        total_price = price_breakdown['total_price'] * nights if price_breakdown else 0
+
         message_lines.append(f"<p><strong>Base Rate Per Night:</strong> ${base_price:.2f}</p>")
         message_lines.append(f"<p><strong>Total Rate:</strong> ${total_price:.2f} (for {nights} nights, {adults} adults, {children} children)</p>")
-        
-        if 'price_breakdown' in acc:
+
+        if price_breakdown:
             message_lines.append("<p><strong>Price Breakdown:</strong></p>")
             message_lines.append("<ul>")
             message_lines.append(f"<li>Adults: {price_breakdown['adults']['count']} x ${price_breakdown['base_rate_per_person']:.2f} = ${price_breakdown['adults']['total']:.2f} per night</li>")
             if price_breakdown['children']:
-                message_lines.append(f"<li>Children: {price_breakdown['children']['count']} x ${price_breakdown['base_rate_per_person'] * 0.75:.2f} = ${price_breakdown['children']['total']:.2f} per night</li>")
+                child_rate = price_breakdown['children']['total'] / price_breakdown['children']['count']
+                message_lines.append(f"<li>Children: {price_breakdown['children']['count']} x ${child_rate:.2f} = ${price_breakdown['children']['total']:.2f} per night</li>")
+            if price_breakdown.get('taxes'):
+                message_lines.append(f"<li>Taxes: ${price_breakdown['taxes']:.2f} per night</li>")
             message_lines.append("</ul>")
         
         message_lines.append(f"<p><strong>Overall Rating:</strong> {acc['rating']} ({acc['reviews']} reviews)</p>")
@@ -93,7 +95,12 @@ def format_accommodation_message(accommodations, check_in_date, check_out_date,
     return "".join(message_lines)
     
 @function_tool
-def search_accommodation(data: SearchAccommodationInput, user_id: Optional[str] = None, thread_id: Optional[str] = None) -> Optional[SearchAccommodationOutput]:
+def search_accommodation(wrapper: RunContextWrapper[UserInfo], data: SearchAccommodationInput) -> Optional[SearchAccommodationOutput]:
+    return find_accommodation(wrapper.context.user_id, wrapper.context.thread_id, data)
+
+
+def find_accommodation(user_id, thread_id, data: SearchAccommodationInput) -> SearchAccommodationOutput:
+    """search_accommodation without the tool wrapper, for callers that already know the user."""
     params = {
         "engine": "google_hotels",
         "q": data.location,
@@ -116,7 +123,7 @@ def search_accommodation(data: SearchAccommodationInput, user_id: Optional[str]
     logger.info(f"Fetching accommodation in {data.location} with params: {params}")
     
     try:
-        response = requests.get("https://serpapi.com/search.json", params=params)
+        response = requests.get(SERP_API_URL, params=params)
         response.raise_for_status()
         api_data = response.json()
         logger.info(f"API Response for {data.location}:\n{json.dumps(api_data, indent=2)}")
@@ -132,32 +139,18 @@ def search_accommodation(data: SearchAccommodationInput, user_id: Optional[str]
     children = getattr(data, 'children', 0)
     
     if 'properties' in api_data:
-        for prop in api_data['properties'][:3]:
+        properties = api_data['properties'][:3]
+        # Price all properties in one pass; None where there's no rate
+        breakdowns = price_stay_rates(
+            [prop.get('rate_per_night', {}).get('extracted_lowest', 0) for prop in properties], adults, children
+        )
+        for prop, breakdown in zip(properties, breakdowns):
             link = prop.get('link', '')
             image_urls = [img['thumbnail'] for img in prop.get('images', [])[:3] if 'thumbnail' in img]
-            
+
             base_price = prop.get('rate_per_night', {}).get('extracted_lowest', 0)
-            
-            # Create price breakdown if possible
-            price_breakdown = None
-            if base_price > 0:
-                total_adults = base_price * adults
-                total_children = base_price * 0.75 * children if children else 0
-                total_price = total_adults + total_children
-                
-                price_breakdown = {
-                    'base_rate_per_person': base_price,
-                    'adults': {
-                        'count': adults,
-                        'total': total_adults
-                    },
-                    'children': {
-                        'count': children,
-                        'total': total_children
-                    } if children else None,
-                    'total_price': total_price
-                }
-            
+            price_breakdown = breakdown.model_dump() if breakdown else None
+
             accommodation_results.append({
                 'id': str(uuid.uuid4()),
                 'name': prop.get('name', 'Unknown'),
@@ -179,32 +172,15 @@ def search_accommodation(data: SearchAccommodationInput, user_id: Optional[str]
 
     if len(accommodation_results) < 3 and 'ads' in api_data:
         remaining_slots = 3 - len(accommodation_results)
-        for ad in api_data['ads'][:remaining_slots]:
+        ads = api_data['ads'][:remaining_slots]
+        breakdowns = price_stay_rates([ad.get('extracted_price', 0) for ad in ads], adults, children)
+        for ad, breakdown in zip(ads, breakdowns):
             link = ad.get('link', '')
             image_urls = [ad['thumbnail']] if ad.get('thumbnail') else []
-            
+
             base_price = ad.get('extracted_price', 0)
-            
-            # Create price breakdown if possible
-            price_breakdown = None
-            if base_price > 0:
-                total_adults = base_price * adults
-                total_children = base_price * 0.75 * children if children else 0
-                total_price = total_adults + total_children
-                
-                price_breakdown = {
-                    'base_rate_per_person': base_price,
-                    'adults': {
-                        'count': adults,
-                        'total': total_adults
-                    },
-                    'children': {
-                        'count': children,
-                        'total': total_children
-                    } if children else None,
-                    'total_price': total_price
-                }
-            
+            price_breakdown = breakdown.model_dump() if breakdown else None
+
             accommodation_results.append({
                 'id': str(uuid.uuid4()),
                 'name': ad.get('name', 'Unknown'),
@@ -225,11 +201,20 @@ def search_accommodation(data: SearchAccommodationInput, user_id: Optional[str]
             })
             
     if user_id and thread_id:
-        # Store all options together
-        set_context(user_id, thread_id, "accommodation_options", accommodation_results)
-        # Also store individual options
-        for accommodation_option in accommodation_results:
-            set_context(user_id, thread_id, f"accommodation_option_{accommodation_option['id']}", accommodation_option)
+        # Keep each option once, packed, so booking can look it up by id
+        store_options(
+            user_id,
+            thread_id,
+            "accommodation",
+            accommodation_results,
+            meta={
+                "location": data.location,
+                "check_in_date": params["check_in_date"],
+                "check_out_date": params["check_out_date"],
+                "adults": adults,
+                "children": children,
+            },
+        )
 
     output_message = format_accommodation_message(
         accommodation_results, 
@@ -1,10 +1,14 @@
+import math
 import os
+import re
 import requests
 import logging
 import uuid
 from typing import Optional
-from in_memory_context import set_context
-from agents import function_tool
+from option_store import store_options
+from fare_rules import price_flight_fares
+from agents import function_tool, RunContextWrapper
+from models.context_models import UserInfo
 from datetime import datetime
 from dotenv import load_dotenv
 import json
@@ -14,8 +18,6 @@ from models.flight_models import (
     FlightLeg,
     FlightSegment,
     LayoverInfo,
-    PriceBreakdown,
-    PriceBreakdownEntry,
     SearchFlightInput,
     SearchFlightOutput,
 )
@@ -26,6 +28,8 @@ load_dotenv()
 
 logger = logging.getLogger("chat_logger")
 SERP_API_KEY = os.getenv("SERP_API_KEY")
+# Point at a local stub (see serpapi_stub.py) to run without network access
+SERP_API_URL = os.getenv("SERP_API_URL", "https://serpapi.com/search.json")
 
 def format_duration(value) -> str:
     try:
@@ -101,6 +105,95 @@ def format_flight_option(option: FlightOption, index: int, trip_type: str) -> st
     return formatted
 
 
+def _price(data: SearchFlightInput, base_fares, route=None):
+    """PriceBreakdowns for per-person base fares under the fare rules for this search."""
+    return price_flight_fares(
+        base_fares,
+        data.adults,
+        data.children,
+        data.infants,
+        cabin=data.cabin_class,
+        route=route or f"{data.origin}-{data.destination}",
+    )
+
+
+# google_flights travel_class values
+TRAVEL_CLASSES = {"economy": 1, "premium economy": 2, "business": 3, "first": 4}
+AIRLINE_ALLIANCES = {"STAR_ALLIANCE", "SKYTEAM", "ONEWORLD"}
+
+
+def _is_airline_code(airline: str) -> bool:
+    airline = airline.strip().upper()
+    return bool(re.fullmatch(r"[A-Z0-9]{2}", airline)) or airline in AIRLINE_ALLIANCES
+
+
+def _filter_params(data: SearchFlightInput, with_price=True) -> dict:
+    """SerpAPI query parameters for the filters in `data` that google_flights applies itself.
+
+    Airlines go upstream only as IATA codes or alliances, and include and exclude
+    can't be sent together; whatever isn't sent is left to _matches_filters.
+    """
+    params = {
+        "travel_class": TRAVEL_CLASSES.get((data.cabin_class or "economy").strip().lower().replace("_", " ")),
+        "stops": 1 if data.nonstop_only else None,  # 1 = nonstop only
+        "max_price": math.ceil(data.max_price) if with_price and data.max_price else None,
+        "children": data.children or None,
+        "infants_on_lap": data.infants or None,
+    }
+    allowed = data.allowed_airlines or []
+    excluded = [airline.strip().upper() for airline in data.excluded_airlines or [] if _is_airline_code(airline)]
+    if allowed and all(_is_airline_code(airline) for airline in allowed):
+        params["include_airlines"] = ",".join(airline.strip().upper() for airline in allowed)
+    elif excluded:
+        params["exclude_airlines"] = ",".join(excluded)
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def _group_price(group) -> float:
+    price = group.get("price")
+    if isinstance(price, dict):
+        price = price.get("value")
+    return float(price or 0)
+
+
+def _fare_per_person(option: FlightOption) -> float:
+    """The option's per-person fare for the whole itinerary, the price max_price is compared with."""
+    if option.price_breakdown:
+        return option.price_breakdown[0].base_fare_per_person
+    return option.total_price
+
+
+def _airline_ids(flight) -> set:
+    """A flight's airline name and IATA code (from its flight number), lowercased."""
+    code = (flight.get("flight_number") or "").split(" ")[0]
+    return {value.strip().lower() for value in (flight.get("airline") or "", code) if value.strip()}
+
+
+def _matches_filters(group, data: SearchFlightInput, check_price=True) -> bool:
+    """Whether a result group meets the filters in `data`, for those upstream didn't (or couldn't) apply."""
+    flights = group.get("flights") or []
+    if data.nonstop_only and len(flights) > 1:
+        return False
+    if check_price and data.max_price and _group_price(group) > data.max_price:
+        return False
+    allowed = {airline.strip().lower() for airline in data.allowed_airlines or []}
+    excluded = {airline.strip().lower() for airline in data.excluded_airlines or []}
+    for flight in flights:
+        ids = _airline_ids(flight)
+        if (allowed and not ids & allowed) or ids & excluded:
+            return False
+    return True
+
+
+def _candidate_groups(response_data, data: SearchFlightInput, check_price=True) -> list:
+    """Result groups (best first, then the others) that meet the search filters."""
+    groups = (response_data.get("best_flights") or []) + (response_data.get("other_flights") or [])
+    candidates = [group for group in groups if _matches_filters(group, data, check_price)]
+    if len(candidates) < len(groups):
+        logger.info(f"Filtered out {len(groups) - len(candidates)} of {len(groups)} flight groups")
+    return candidates
+
+
 def build_multi_city_flight_option(group, flights, data, segments, layovers_data) -> Optional[FlightOption]:
     from dateutil import parser
 
@@ -117,22 +210,9 @@ def build_multi_city_flight_option(group, flights, data, segments, layovers_data
         base_price = 0
         currency = "USD"
 
-    adults = data.adults
-    children = data.children
-    infants = data.infants
-
-    total_adults = base_price * adults
-    total_children = base_price * 0.75 * children
-    total_infants = base_price * 0.10 * infants
-    total_price = total_adults + total_children + total_infants
-
-    price_breakdown = PriceBreakdown(
-        base_fare_per_person=base_price,
-        adults=PriceBreakdownEntry(count=adults, total=total_adults),
-        children=PriceBreakdownEntry(count=children, total=total_children) if children else None,
-        infants=PriceBreakdownEntry(count=infants, total=total_infants) if infants else None,
-        total_price=total_price
-    )
+    first_leg = data.multi_city_legs[0] if data.multi_city_legs else data
+    price_breakdown = _price(data, [base_price], f"{first_leg.origin}-{first_leg.destination}")[0]
+    total_price = price_breakdown.total_price
 
     # Rest of the function remains the same...
     airline_set = set()
@@ -252,11 +332,13 @@ def build_round_trip_flight_option(group, outbound_flights, data, outbound_segme
             "hl": "en",
             "currency": "USD",
             "adults": data.adults,
-            "api_key": SERP_API_KEY
+            "api_key": SERP_API_KEY,
+            # The return fare is priced on its own, so max_price only applies to the outbound search
+            **_filter_params(data, with_price=False),
         }
 
         logger.info(f"Fetching return flight with params: {return_params}")
-        return_response = requests.get("https://serpapi.com/search.json", params=return_params, timeout=30)
+        return_response = requests.get(SERP_API_URL, params=return_params, timeout=30)
         
         if return_response.status_code != 200:
             logger.error(f"Failed to fetch return flights: {return_response.status_code}")
@@ -266,7 +348,7 @@ def build_round_trip_flight_option(group, outbound_flights, data, outbound_segme
         logger.info(f"Return Flight API Response:\n{json.dumps(return_data, indent=2)}")
         
         # Check if we actually got return flights
-        return_flights = return_data.get("best_flights") or return_data.get("other_flights") or []
+        return_flights = _candidate_groups(return_data, data, check_price=False)
         if not return_flights:
             logger.warning("No return flights found for this option")
             return None
@@ -324,24 +406,8 @@ def build_round_trip_flight_option(group, outbound_flights, data, outbound_segme
         return_price = float(return_group.get("price", 0)) if return_group.get("price") else 0
         base_price = outbound_price + return_price
         
-        adults = data.adults
-        children = data.children
-        infants = data.infants
-
-        total_price = base_price * (adults + 0.75 * children + 0.10 * infants)
-        price_breakdown = PriceBreakdown(
-            base_fare_per_person=base_price,
-            adults=PriceBreakdownEntry(count=adults, total=outbound_price * adults + return_price * adults),
-            children=PriceBreakdownEntry(
-                count=children, 
-                total=outbound_price * 0.75 * children + return_price * 0.75 * children
-            ) if children else None,
-            infants=PriceBreakdownEntry(
-                count=infants, 
-                total=outbound_price * 0.10 * infants + return_price * 0.10 * infants
-            ) if infants else None,
-            total_price=total_price
-        )
+        price_breakdown = _price(data, [base_price])[0]
+        total_price = price_breakdown.total_price
 
         # --- Build Flight Legs ---
         last_outbound = outbound_flights[-1]
@@ -397,31 +463,17 @@ def build_round_trip_flight_option(group, outbound_flights, data, outbound_segme
         logger.error(f"Error building round trip option: {str(err)}", exc_info=True)
         return None
 
-def build_one_way_flight_option(group, flights, data, segments_data, layovers_data) -> FlightOption:
+def build_one_way_flight_option(group, flights, data, segments_data, layovers_data, price_breakdown=None) -> FlightOption:
     import uuid
     from typing import List
 
     first_flight = flights[0]
     segments_data = flights
 
-    # 1. --- Price Breakdown ---
-    base_price = float(group.get("price", 0)) if group.get("price") else 0
-    adults = data.adults
-    children = data.children
-    infants = data.infants
-
-    total_adults = base_price * adults
-    total_children = base_price * 0.75 * children
-    total_infants = base_price * 0.10 * infants
-    total_price = total_adults + total_children + total_infants
-
-    price_breakdown = PriceBreakdown(
-        base_fare_per_person=base_price,
-        adults=PriceBreakdownEntry(count=adults, total=total_adults),
-        children=PriceBreakdownEntry(count=children, total=total_children) if children else None,
-        infants=PriceBreakdownEntry(count=infants, total=total_infants) if infants else None,
-        total_price=total_price
-    )
+    # 1. --- Price Breakdown --- (find_flights prices all groups in one batch)
+    if price_breakdown is None:
+        price_breakdown = _price(data, [group.get("price")])[0]
+    total_price = price_breakdown.total_price
 
     # 2. --- Flight Segments ---
     flight_segments: List[FlightSegment] = []
@@ -485,7 +537,12 @@ def build_one_way_flight_option(group, flights, data, segments_data, layovers_da
 
 
 @function_tool
-def search_flight(data: SearchFlightInput, user_id: Optional[str] = None, thread_id: Optional[str] = None) -> Optional[SearchFlightOutput]:
+def search_flight(wrapper: RunContextWrapper[UserInfo], data: SearchFlightInput) -> Optional[SearchFlightOutput]:
+    return find_flights(wrapper.context.user_id, wrapper.context.thread_id, data)
+
+
+def find_flights(user_id, thread_id, data: SearchFlightInput) -> SearchFlightOutput:
+    """search_flight without the tool wrapper, for callers that already know the user."""
     try:
         is_multi_city = data.multi_city_legs is not None and len(data.multi_city_legs) > 0
         flight_results = []
@@ -509,11 +566,13 @@ def search_flight(data: SearchFlightInput, user_id: Optional[str] = None, thread
                     "hl": "en",
                     "currency": "USD",
                     "adults": data.adults,
-                    "api_key": SERP_API_KEY
+                    "api_key": SERP_API_KEY,
+                    # max_price is for the whole itinerary, not each leg
+                    **_filter_params(data, with_price=False),
                 }
                 
                 logger.info(f"Fetching leg {leg.origin}-{leg.destination} with params: {params}")
-                response = requests.get("https://serpapi.com/search.json", params=params)
+                response = requests.get(SERP_API_URL, params=params)
                 if response.status_code != 200:
                     raise Exception(f"SERP API error for leg {leg.origin}-{leg.destination}: {response.status_code}")
                 
@@ -527,7 +586,7 @@ def search_flight(data: SearchFlightInput, user_id: Optional[str] = None, thread
                 if 'other_flights' in leg_data:
                     logger.info(f"Other flights count: {len(leg_data['other_flights']) if leg_data['other_flights'] else 0}")
                 
-                leg_groups = leg_data.get("best_flights") or leg_data.get("other_flights") or []
+                leg_groups = _candidate_groups(leg_data, data, check_price=False)
                 all_leg_options.append(leg_groups[:3])  # Take top 3 options for each leg
                 
                 # Log details of each flight group in this leg
@@ -629,21 +688,25 @@ def search_flight(data: SearchFlightInput, user_id: Optional[str] = None, thread
                 "hl": "en",
                 "currency": "USD",
                 "adults": data.adults,
-                "api_key": SERP_API_KEY
+                "api_key": SERP_API_KEY,
+                **_filter_params(data),
             }
 
             params = {k: v for k, v in params.items() if v is not None}
 
             logger.info(f"Calling SERP API with params: {params}")
-            response = requests.get("https://serpapi.com/search.json", params=params)
+            response = requests.get(SERP_API_URL, params=params)
             if response.status_code != 200:
                 raise Exception(f"SERP API error: {response.status_code} - {response.text}")
 
             data_json = response.json()
             logger.info(f"Complete SERP API Response:\n{json.dumps(data_json, indent=2)}")
             
-            all_flight_groups = data_json.get("best_flights") or data_json.get("other_flights") or []
+            all_flight_groups = _candidate_groups(data_json, data)
             max_results = 3
+            # One-way fares are final here, so price them all at once; round trips add the return fare later
+            if trip_type != 1:
+                one_way_prices = _price(data, [group.get("price") for group in all_flight_groups[:max_results]])
 
             for index, group in enumerate(all_flight_groups[:max_results]):
                 flights = group.get("flights", [])
@@ -661,7 +724,9 @@ def search_flight(data: SearchFlightInput, user_id: Optional[str] = None, thread
                         logger.warning(f"Skipping incomplete round-trip option {index + 1}")
                         continue
                 else:
-                    flight_option = build_one_way_flight_option(group, flights, data, segments, layovers)
+                    flight_option = build_one_way_flight_option(
+                        group, flights, data, segments, layovers, price_breakdown=one_way_prices[index]
+                    )
                     trip_type_str = "one-way"
 
                 formatted_summary = format_flight_option(flight_option, index, trip_type_str)
@@ -670,10 +735,34 @@ def search_flight(data: SearchFlightInput, user_id: Optional[str] = None, thread
                 logger.info(f"Formatted flight option {index + 1}:\n{formatted_summary}")
                 flight_results.append(flight_option)
 
-        # Store context if needed
+        # Return and per-leg calls can't be capped upstream, so check the assembled
+        # per-person fare: max_price means what SerpAPI's does, not the party total
+        if data.max_price:
+            within_budget = [option for option in flight_results if _fare_per_person(option) <= data.max_price]
+            if len(within_budget) < len(flight_results):
+                logger.info(
+                    f"Dropped {len(flight_results) - len(within_budget)} flight options over max_price {data.max_price}"
+                )
+                trip_type_str = "multi-city" if trip_type == 3 else "round-trip" if trip_type == 1 else "one-way"
+                for index, option in enumerate(within_budget):
+                    option.formatted_summary = format_flight_option(option, index, trip_type_str)
+            flight_results = within_budget
+
+        # Keep each option once, packed, so booking can look it up by id
         if user_id and thread_id:
-            for flight_option in flight_results:
-                set_context(user_id, thread_id, f"flight_option_{flight_option.id}", json.loads(flight_option.json()))
+            store_options(
+                user_id,
+                thread_id,
+                "flight",
+                [flight_option.model_dump(mode="json") for flight_option in flight_results],
+                meta={
+                    "trip_type": "multi-city" if trip_type == 3 else "round-trip" if trip_type == 1 else "one-way",
+                    "adults": data.adults,
+                    "children": data.children,
+                    "infants": data.infants,
+                    "cabin_class": data.cabin_class,
+                },
+            )
 
         return SearchFlightOutput(flights=flight_results)
 
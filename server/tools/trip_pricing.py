@@ -0,0 +1,128 @@
+# trip_pricing.py
+#
+# Prices the flight and accommodation the user selected or booked in this
+# thread, straight from the stored search results. No model call: the agents
+# use it as a plain tool instead of handing off to a pricing agent.
+
+import logging
+
+from agents import function_tool, RunContextWrapper
+
+from in_memory_context import get_context
+from models.context_models import UserInfo
+from models.flight_models import BreakdownDetail, PriceCalculationOutput, TripPriceInput
+from option_store import get_option_set
+from tools.price_calculator_tool import format_price_output
+from tools.search_accommodation import calculate_nights
+
+logger = logging.getLogger("chat_logger")
+
+
+def _pick(user_id, thread_id, kind, ref):
+    """The option set and option for `ref`, falling back to the one booked in this thread."""
+    option_set = get_option_set(user_id, thread_id, kind)
+    if option_set is None:
+        return None, None
+    if ref:
+        return option_set, option_set.resolve(ref)
+    # By id only: the booked option may come from an earlier search than this set
+    booked_id = get_context(user_id, thread_id, f"last_{kind}_id")
+    return option_set, option_set.get(booked_id) if booked_id else None
+
+
+def _price_flight(option, meta):
+    total = float(option.get("total_price") or 0)
+    breakdown = (option.get("price_breakdown") or [{}])[0] or {}
+    travelers = sum(
+        int(meta.get(group) or (breakdown.get(group) or {}).get("count") or 0)
+        for group in ("adults", "children", "infants")
+    ) or 1
+    legs = option.get("legs") or []
+    details = {
+        "airline": option.get("airline") or ["Unknown"],
+        "flight_numbers": [
+            seg["flight_number"]
+            for leg in legs
+            for seg in leg.get("segments") or []
+            if seg.get("flight_number")
+        ],
+        "origin": legs[0]["origin"] if legs else "Unknown",
+        "destination": legs[0]["destination"] if legs else "Unknown",
+        "dates": " / ".join(leg["departure_date_time"] for leg in legs) or "Unknown",
+        "travelers": travelers,
+        "per_traveler": total / travelers,
+    }
+    return total, details
+
+
+def _price_accommodation(option, meta):
+    breakdown = option.get("price_breakdown") or {}
+    price_info = option.get("price_info") or {}
+    per_night = float(breakdown.get("total_price") or price_info.get("extracted_price") or 0)
+    check_in, check_out = meta.get("check_in_date"), meta.get("check_out_date")
+    nights = max(1, calculate_nights(check_in, check_out)) if check_in and check_out else 1
+    details = {
+        "hotel_name": option.get("name", "Unknown"),
+        "room_type": (option.get("type") or "hotel").title(),
+        "check_in": check_in or "Unknown",
+        "check_out": check_out or "Unknown",
+        "nights": nights,
+        "per_night": per_night,
+    }
+    return per_night * nights, details
+
+
+def price_trip(user_id, thread_id, input: TripPriceInput) -> PriceCalculationOutput:
+    flight_cost = accommodation_cost = None
+    flight_details, accommodation_details = {}, {}
+    currency = "USD"
+    missing = []
+
+    if input.include_flight:
+        option_set, option = _pick(user_id, thread_id, "flight", input.flight_option)
+        if option:
+            flight_cost, flight_details = _price_flight(option, option_set.meta)
+            currency = option.get("currency") or currency
+        else:
+            missing.append("flight")
+
+    if input.include_accommodation:
+        option_set, option = _pick(user_id, thread_id, "accommodation", input.accommodation_option)
+        if option:
+            accommodation_cost, accommodation_details = _price_accommodation(option, option_set.meta)
+        else:
+            missing.append("accommodation")
+
+    total = (flight_cost or 0) + (accommodation_cost or 0)
+    breakdown = BreakdownDetail(
+        flight_cost=flight_cost,
+        accommodation_cost=accommodation_cost,
+        taxes_and_fees=0,
+        currency=currency,
+        travelers=flight_details.get("travelers"),
+        per_traveler_cost=flight_details.get("per_traveler"),
+        nights=accommodation_details.get("nights"),
+        per_night_cost=accommodation_details.get("per_night"),
+    )
+    formatted = format_price_output({
+        "total_cost": total,
+        "breakdown": breakdown.model_dump(),
+        "flight_details": flight_details,
+        "accommodation_details": accommodation_details,
+    })
+    if missing:
+        formatted += (
+            f"\nNo selected or booked {' or '.join(missing)} found in this conversation "
+            "(search results expire after an hour); ask the user which option to price.\n"
+        )
+    return PriceCalculationOutput(total_cost=total, breakdown=breakdown, formatted_output=formatted)
+
+
+@function_tool
+def calculate_trip_price(wrapper: RunContextWrapper[UserInfo], input: TripPriceInput) -> PriceCalculationOutput:
+    """Total trip cost with per-traveller and per-night breakdowns, computed from the flight and
+    accommodation options the user selected or booked in this conversation. Show `formatted_output` as is."""
+    user_id = wrapper.context.user_id
+    thread_id = wrapper.context.thread_id
+    logger.info(f"Pricing trip for user {user_id}: {input.model_dump()}")
+    return price_trip(user_id, thread_id, input)
@@ -0,0 +1,112 @@
+# server/warmup.py
+#
+# The agent stack (openai, agents, every agent module with its tools and
+# instruction strings) takes seconds to import. main.py no longer imports it
+# at module level, so the server binds its port right away; this warm-up runs
+# in the background after startup and imports it, timing each module, then
+# primes what the first chat turn needs. /ready answers 503 until it's done.
+#
+# A chat turn that arrives first awaits wait_ready() rather than importing the
+# stack itself, which would run on the event loop and stall every stream.
+
+import asyncio
+import importlib
+import logging
+import sys
+import time
+
+logger = logging.getLogger("chat_logger")
+
+# In the order the first /chat turn needs them. dateparser is left out: the
+# date tool only falls back to it for unusual phrasings.
+WARMUP_MODULES = (
+    "openai",
+    "agents",
+    "openai.types.responses",
+    "sqlalchemy",
+    "models.db_models",
+    "dateutil.parser",
+    "run_agents.triage_agent",
+    "offline_model",
+)
+
+_profile = []  # (module, seconds, modules newly loaded)
+_ready = asyncio.Event()
+_timings = {"started_at": None, "finished_at": None}
+
+
+def timed_import(name: str):
+    before = len(sys.modules)
+    started = time.perf_counter()
+    importlib.import_module(name)
+    elapsed = time.perf_counter() - started
+    _profile.append((name, elapsed, len(sys.modules) - before))
+    return elapsed
+
+
+def _prime():
+    """Build the things the first turn would otherwise build: the run config and the tokenizer."""
+    from offline_model import run_config
+    from token_count import count_tokens
+
+    run_config()
+    count_tokens("warm up")
+
+
+async def _prime_database():
+    from sqlalchemy import text
+
+    from db.session import async_engine
+
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+async def warm_up():
+    _timings["started_at"] = time.time()
+    try:
+        for name in WARMUP_MODULES:
+            # In a thread so /health and the other light endpoints keep answering meanwhile
+            await asyncio.to_thread(timed_import, name)
+        await asyncio.to_thread(_prime)
+    except Exception as e:
+        logger.error(f"Warm-up failed, modules will load on first use: {e}", exc_info=True)
+    try:
+        await _prime_database()
+    except Exception as e:
+        logger.warning(f"Warm-up could not open a database connection: {e}")
+    _timings["finished_at"] = time.time()
+    _ready.set()
+    log_report()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+async def wait_ready():
+    """Return once the warm-up has finished, whether or not it succeeded."""
+    await _ready.wait()
+
+
+def log_report():
+    total = sum(seconds for _, seconds, _ in _profile)
+    lines = [f"Startup imports took {total:.2f}s:"]
+    for name, seconds, loaded in sorted(_profile, key=lambda row: row[1], reverse=True):
+        lines.append(f"  {seconds * 1000:8.1f} ms  {loaded:5d} modules  {name}")
+    logger.info("\n".join(lines))
+
+
+def startup_stats(app_import_seconds: float = None):
+    """Per-module import times of the warm-up, slowest first."""
+    started, finished = _timings["started_at"], _timings["finished_at"]
+    return {
+        "ready": is_ready(),
+        "app_import_seconds": round(app_import_seconds, 3) if app_import_seconds is not None else None,
+        "warmup_seconds": round(finished - started, 3) if started and finished else None,
+        "loaded_modules": len(sys.modules),
+        "imports": [
+            {"module": name, "ms": round(seconds * 1000, 1), "modules_loaded": loaded}
+            for name, seconds, loaded in sorted(_profile, key=lambda row: row[1], reverse=True)
+        ],
+    }